@@ -0,0 +1,820 @@
+"""
+A minimal asyncio client for the Docker Engine API
+
+Implements the subset of docker.APIClient used by the spawners,
+with the same arguments and return values,
+but as coroutines running on the event loop instead of blocking calls.
+"""
+
+import asyncio
+import base64
+import json
+import shlex
+import ssl
+import struct
+from urllib.parse import quote, urlencode, urlparse
+
+import requests
+from docker import auth
+from docker.constants import DEFAULT_DOCKER_API_VERSION, IS_WINDOWS_PLATFORM
+from docker.errors import DockerException, create_api_error_from_http_exception
+from docker.types import ContainerConfig, HostConfig, ServiceMode
+from docker.utils import (
+    convert_filters,
+    convert_service_networks,
+    format_environment,
+    parse_host,
+    parse_repository_tag,
+)
+
+_default_timeout = 60
+
+# sentinel for "use the client's timeout"
+_client_timeout = object()
+
+
+def _quote(arg):
+    return quote(str(arg), safe="/:")
+
+
+def _strip_none(data):
+    """Drop None values from a request body, like docker-py does"""
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def _bool_param(value):
+    return 1 if value else 0
+
+
+def _ssl_context(tls):
+    """Build an SSLContext from a docker.tls.TLSConfig (or True)"""
+    if tls is True:
+        return ssl.create_default_context()
+    if tls.verify:
+        ctx = ssl.create_default_context(cafile=tls.ca_cert or None)
+    else:
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    if tls.cert:
+        ctx.load_cert_chain(*tls.cert)
+    return ctx
+
+
+class _Response:
+    """An HTTP response whose body may not have been read yet"""
+
+    def __init__(self, status, reason, headers, reader, writer):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def has_body(self):
+        return self.status >= 200 and self.status not in {204, 304}
+
+    @property
+    def chunked(self):
+        return self.headers.get("transfer-encoding", "").lower() == "chunked"
+
+    @property
+    def keep_alive(self):
+        if self.headers.get("connection", "").lower() == "close":
+            return False
+        return not self.has_body or self.chunked or "content-length" in self.headers
+
+    async def iter_chunks(self):
+        """Iterate over the body as it arrives"""
+        reader = self.reader
+        if not self.has_body:
+            return
+        if self.chunked:
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # consume trailers
+                    while (await reader.readline()) not in (b"\r\n", b""):
+                        pass
+                    return
+                chunk = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield chunk
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(remaining, 65536))
+                if not chunk:
+                    raise ConnectionError("Connection closed while reading response")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            # hijacked or close-delimited stream
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+
+class AsyncDockerClient:
+    """Asyncio client for the Docker Engine API
+
+    Accepts the same connection arguments as docker.APIClient
+    (``base_url``, ``version``, ``timeout``, ``tls``, ``max_pool_size``),
+    so it can be constructed from the same ``tls_config``, ``client_kwargs``
+    and ``DOCKER_HOST`` environment.
+
+    Connections are made with asyncio streams over the unix socket or TCP (optionally TLS).
+    Idle connections are kept for reuse, up to ``max_pool_size``.
+    """
+
+    def __init__(
+        self,
+        base_url=None,
+        version=None,
+        timeout=_default_timeout,
+        tls=False,
+        max_pool_size=10,
+        user_agent="dockerspawner",
+        credstore_env=None,
+        use_ssh_client=False,
+    ):
+        if use_ssh_client:
+            raise DockerException(
+                "ssh connections are not supported by the asyncio docker client"
+            )
+        url = urlparse(parse_host(base_url, IS_WINDOWS_PLATFORM, tls=bool(tls)))
+        if url.scheme == "http+unix":
+            # same as docker.APIClient
+            self.base_url = "http+docker://localhost"
+            self._unix_path = url.path
+            self._host = "localhost"
+            self._port = None
+            self._ssl = None
+        elif url.scheme in {"http", "https"}:
+            self.base_url = url.geturl()
+            self._unix_path = None
+            self._host = url.hostname
+            self._port = url.port or (443 if url.scheme == "https" else 80)
+            self._ssl = _ssl_context(tls) if url.scheme == "https" else None
+        else:
+            raise DockerException(
+                f"Unsupported docker host for the asyncio docker client: {base_url}"
+            )
+        self.timeout = timeout
+        self.max_pool_size = max_pool_size
+        self.user_agent = user_agent
+        self.credstore_env = credstore_env
+        self._auth_configs = None
+        if version in {None, "auto"}:
+            self._version = None
+        else:
+            self._version = version
+        self._idle = []
+        self._idle_loop = None
+
+    @property
+    def api_version(self):
+        """The API version in use
+
+        Before the version has been negotiated with ``version="auto"``,
+        this is docker-py's default API version.
+        """
+        return self._version or DEFAULT_DOCKER_API_VERSION
+
+    # connection handling
+
+    async def _connect(self, reuse=True):
+        """Get a connection
+
+        Returns (reader, writer, reused)
+        """
+        if self._idle_loop is not asyncio.get_running_loop():
+            # connections belong to the loop they were opened on
+            self._idle = []
+            self._idle_loop = asyncio.get_running_loop()
+        while reuse and self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        if self._unix_path:
+            reader, writer = await asyncio.open_unix_connection(self._unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(
+                self._host, self._port, ssl=self._ssl
+            )
+        return reader, writer, False
+
+    def _release(self, response):
+        if (
+            response.keep_alive
+            and len(self._idle) < self.max_pool_size
+            and self._idle_loop is asyncio.get_running_loop()
+        ):
+            self._idle.append((response.reader, response.writer))
+        else:
+            response.writer.close()
+
+    async def _ensure_version(self):
+        if self._version is None:
+            response = await self._request("GET", "/version", versioned=False)
+            self._version = json.loads(await self._read(response))["ApiVersion"]
+
+    async def _request(
+        self,
+        method,
+        path,
+        params=None,
+        body=None,
+        headers=None,
+        versioned=True,
+    ):
+        """Send a request, return the response once its headers have arrived
+
+        Raises docker.errors.APIError for error responses.
+        """
+        if versioned:
+            await self._ensure_version()
+            path = f"/v{self._version}{path}"
+        if params:
+            params = {key: value for key, value in params.items() if value is not None}
+            if params:
+                path = f"{path}?{urlencode(params)}"
+        all_headers = {
+            "Host": self._host,
+            "User-Agent": self.user_agent,
+        }
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf8")
+            all_headers["Content-Type"] = "application/json"
+        elif hasattr(body, "read"):
+            body = body.read()
+        if body is None:
+            body = b""
+        if body or method in {"POST", "PUT"}:
+            all_headers["Content-Length"] = str(len(body))
+        all_headers.update(headers or {})
+        request = [f"{method} {path} HTTP/1.1"]
+        request.extend(f"{key}: {value}" for key, value in all_headers.items())
+        head = ("\r\n".join(request) + "\r\n\r\n").encode("latin1")
+
+        reuse = True
+        while True:
+            reader, writer, reused = await self._connect(reuse)
+            try:
+                writer.write(head + body)
+                await writer.drain()
+                status_line, *header_lines = (
+                    (await reader.readuntil(b"\r\n\r\n")).decode("latin1").split("\r\n")
+                )
+            except (asyncio.IncompleteReadError, ConnectionError):
+                writer.close()
+                if reused:
+                    # idle connection was closed by the daemon, retry on a new one
+                    reuse = False
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            break
+        _, status, *reason = status_line.split(" ", 2)
+        response_headers = {}
+        for line in header_lines:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                response_headers[key.strip().lower()] = value.strip()
+        response = _Response(
+            int(status),
+            reason[0] if reason else "",
+            response_headers,
+            reader,
+            writer,
+        )
+        if response.status >= 400:
+            content = await self._read(response)
+            self._raise_for_status(method, path, response, content)
+        return response
+
+    def _raise_for_status(self, method, path, response, content):
+        """Raise the same APIError subclass docker-py would"""
+        r = requests.Response()
+        r.status_code = response.status
+        r.reason = response.reason
+        r.url = f"{self.base_url}{path}"
+        r._content = content
+        http_error = requests.exceptions.HTTPError(
+            f"{response.status} {response.reason} for {method} {r.url}", response=r
+        )
+        create_api_error_from_http_exception(http_error)
+
+    async def _read(self, response):
+        """Read a whole response body, and return the connection to the pool"""
+        try:
+            content = await response.read()
+        except BaseException:
+            response.writer.close()
+            raise
+        self._release(response)
+        return content
+
+    async def _call(
+        self,
+        method,
+        path,
+        params=None,
+        body=None,
+        headers=None,
+        timeout=_client_timeout,
+        decode=True,
+    ):
+        """Make a request and return the body
+
+        JSON responses are decoded, unless decode=False.
+        """
+        if timeout is _client_timeout:
+            timeout = self.timeout
+
+        async def call():
+            response = await self._request(
+                method, path, params=params, body=body, headers=headers
+            )
+            content = await self._read(response)
+            content_type = response.headers.get("content-type", "")
+            if decode and content_type.startswith("application/json"):
+                return json.loads(content) if content else None
+            return content
+
+        return await asyncio.wait_for(call(), timeout)
+
+    async def _stream(self, response, decode):
+        """Iterate over a streamed response
+
+        With decode, yields one decoded object per line of JSON.
+        """
+        try:
+            if not decode:
+                async for chunk in response.iter_chunks():
+                    yield chunk
+                return
+            buf = b""
+            async for chunk in response.iter_chunks():
+                buf += chunk
+                *lines, buf = buf.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+            if buf.strip():
+                yield json.loads(buf)
+        finally:
+            # a partially consumed stream can't be reused
+            response.writer.close()
+
+    def _auth_header(self, image):
+        """Find registry credentials for an image, as docker-py does"""
+        registry, _ = auth.resolve_repository_name(image)
+        if not self._auth_configs or self._auth_configs.is_empty:
+            self._auth_configs = auth.load_config(credstore_env=self.credstore_env)
+        authcfg = auth.resolve_authconfig(
+            self._auth_configs, registry, credstore_env=self.credstore_env
+        )
+        if authcfg:
+            return {"X-Registry-Auth": auth.encode_header(authcfg).decode("ascii")}
+        return {}
+
+    def create_host_config(self, *args, **kwargs):
+        """Create a HostConfig dict (no API call)"""
+        return HostConfig(*args, version=self.api_version, **kwargs)
+
+    def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    # API methods, named after their docker.APIClient equivalents
+
+    async def version(self):
+        response = await self._request("GET", "/version", versioned=False)
+        return json.loads(await self._read(response))
+
+    async def containers(
+        self,
+        quiet=False,
+        all=False,
+        trunc=False,
+        latest=False,
+        since=None,
+        before=None,
+        limit=-1,
+        size=False,
+        filters=None,
+    ):
+        params = {
+            "limit": 1 if latest else limit,
+            "all": _bool_param(all),
+            "size": _bool_param(size),
+            "trunc_cmd": _bool_param(trunc),
+            "since": since,
+            "before": before,
+        }
+        if filters:
+            params["filters"] = convert_filters(filters)
+        result = await self._call("GET", "/containers/json", params=params)
+        if quiet:
+            return [{"Id": c["Id"]} for c in result]
+        if trunc:
+            for c in result:
+                c["Id"] = c["Id"][:12]
+        return result
+
+    async def inspect_container(self, container):
+        return await self._call("GET", f"/containers/{_quote(container)}/json")
+
+    async def create_container(
+        self, image, command=None, name=None, platform=None, **kwargs
+    ):
+        await self._ensure_version()
+        config = ContainerConfig(self._version, image, command, **kwargs)
+        return await self._call(
+            "POST",
+            "/containers/create",
+            params={"name": name, "platform": platform},
+            body=_strip_none(config),
+        )
+
+    async def start(self, container):
+        await self._call("POST", f"/containers/{_quote(container)}/start")
+
+    async def stop(self, container, timeout=None):
+        params = {"t": timeout}
+        request_timeout = self.timeout
+        if timeout is not None:
+            request_timeout += timeout
+        await self._call(
+            "POST",
+            f"/containers/{_quote(container)}/stop",
+            params=params,
+            timeout=request_timeout,
+        )
+
+    async def kill(self, container, signal=None):
+        params = {}
+        if signal is not None:
+            if not isinstance(signal, str):
+                signal = int(signal)
+            params["signal"] = signal
+        await self._call("POST", f"/containers/{_quote(container)}/kill", params=params)
+
+    async def pause(self, container):
+        await self._call("POST", f"/containers/{_quote(container)}/pause")
+
+    async def unpause(self, container):
+        await self._call("POST", f"/containers/{_quote(container)}/unpause")
+
+    async def wait(self, container, timeout=None, condition=None):
+        return await self._call(
+            "POST",
+            f"/containers/{_quote(container)}/wait",
+            params={"condition": condition},
+            timeout=timeout,
+        )
+
+    async def remove_container(self, container, v=False, link=False, force=False):
+        params = {
+            "v": _bool_param(v),
+            "link": _bool_param(link),
+            "force": _bool_param(force),
+        }
+        await self._call("DELETE", f"/containers/{_quote(container)}", params=params)
+
+    async def rename(self, container, name):
+        await self._call(
+            "POST", f"/containers/{_quote(container)}/rename", params={"name": name}
+        )
+
+    async def port(self, container, private_port):
+        info = await self.inspect_container(container)
+        port_settings = info.get("NetworkSettings", {}).get("Ports")
+        if port_settings is None:
+            return None
+        if "/" in str(private_port):
+            return port_settings.get(private_port)
+        h_ports = None
+        for protocol in ["tcp", "udp", "sctp"]:
+            h_ports = port_settings.get(f"{private_port}/{protocol}")
+            if h_ports:
+                break
+        return h_ports
+
+    async def put_archive(self, container, path, data):
+        await self._call(
+            "PUT",
+            f"/containers/{_quote(container)}/archive",
+            params={"path": path},
+            body=data,
+            headers={"Content-Type": "application/x-tar"},
+        )
+        return True
+
+    async def exec_create(
+        self,
+        container,
+        cmd,
+        stdout=True,
+        stderr=True,
+        stdin=False,
+        tty=False,
+        privileged=False,
+        user="",
+        environment=None,
+        workdir=None,
+        detach_keys=None,
+    ):
+        if isinstance(cmd, str):
+            cmd = shlex.split(cmd)
+        if isinstance(environment, dict):
+            environment = format_environment(environment)
+        data = {
+            "Container": container,
+            "User": user,
+            "Privileged": privileged,
+            "Tty": tty,
+            "AttachStdin": stdin,
+            "AttachStdout": stdout,
+            "AttachStderr": stderr,
+            "Cmd": cmd,
+            "Env": environment,
+            "WorkingDir": workdir,
+            "detachKeys": detach_keys,
+        }
+        return await self._call(
+            "POST", f"/containers/{_quote(container)}/exec", body=_strip_none(data)
+        )
+
+    async def exec_start(self, exec_id, detach=False, tty=False, demux=False):
+        if isinstance(exec_id, dict):
+            exec_id = exec_id["Id"]
+        response = await self._request(
+            "POST",
+            f"/exec/{_quote(exec_id)}/start",
+            body={"Tty": tty, "Detach": detach},
+        )
+        # exec output is a hijacked connection, read until it's closed
+        try:
+            output = await asyncio.wait_for(response.read(), self.timeout)
+        finally:
+            response.writer.close()
+        if detach:
+            return output
+        if tty:
+            return (output, None) if demux else output
+        # demultiplex stdout/stderr frames
+        streams = {1: [], 2: []}
+        while len(output) >= 8:
+            stream_type, size = struct.unpack(">BxxxL", output[:8])
+            streams.setdefault(stream_type, []).append(output[8 : 8 + size])
+            output = output[8 + size :]
+        stdout = b"".join(streams[1]) or None
+        stderr = b"".join(streams[2]) or None
+        if demux:
+            return stdout, stderr
+        return (stdout or b"") + (stderr or b"")
+
+    async def inspect_image(self, image):
+        return await self._call("GET", f"/images/{_quote(image)}/json")
+
+    async def pull(
+        self,
+        repository,
+        tag=None,
+        stream=False,
+        auth_config=None,
+        decode=False,
+        platform=None,
+        all_tags=False,
+    ):
+        """Pull an image
+
+        With ``stream=True``, returns an async iterator of the progress messages
+        (decoded if ``decode=True``).
+        """
+        repository, image_tag = parse_repository_tag(repository)
+        tag = tag or image_tag or "latest"
+        if all_tags:
+            tag = None
+        if auth_config is None:
+            headers = self._auth_header(repository)
+        else:
+            headers = {"X-Registry-Auth": auth.encode_header(auth_config).decode()}
+        params = {"fromImage": repository, "tag": tag, "platform": platform}
+        if not stream:
+            content = await self._call(
+                "POST",
+                "/images/create",
+                params=params,
+                headers=headers,
+                timeout=None,
+                decode=False,
+            )
+            return content.decode("utf8", "replace")
+        response = await self._request(
+            "POST", "/images/create", params=params, headers=headers
+        )
+        return self._stream(response, decode)
+
+    async def tag(self, image, repository, tag=None, force=False):
+        params = {"repo": repository, "tag": tag, "force": _bool_param(force)}
+        await self._call("POST", f"/images/{_quote(image)}/tag", params=params)
+        return True
+
+    async def remove_image(self, image, force=False, noprune=False):
+        params = {"force": _bool_param(force), "noprune": _bool_param(noprune)}
+        return await self._call("DELETE", f"/images/{_quote(image)}", params=params)
+
+    async def volumes(self, filters=None):
+        params = {}
+        if filters:
+            params["filters"] = convert_filters(filters)
+        return await self._call("GET", "/volumes", params=params)
+
+    async def create_volume(
+        self, name=None, driver=None, driver_opts=None, labels=None
+    ):
+        data = {
+            "Name": name,
+            "Driver": driver,
+            "DriverOpts": driver_opts,
+            "Labels": labels,
+        }
+        return await self._call("POST", "/volumes/create", body=_strip_none(data))
+
+    async def inspect_volume(self, name):
+        return await self._call("GET", f"/volumes/{_quote(name)}")
+
+    async def remove_volume(self, name, force=False):
+        await self._call(
+            "DELETE", f"/volumes/{_quote(name)}", params={"force": _bool_param(force)}
+        )
+
+    async def events(self, since=None, until=None, filters=None, decode=None):
+        """Stream events
+
+        Returns an async iterator of events.
+        """
+        params = {"since": since, "until": until}
+        if filters:
+            params["filters"] = convert_filters(filters)
+        response = await self._request("GET", "/events", params=params)
+        return self._stream(response, decode)
+
+    async def create_service(
+        self,
+        task_template,
+        name=None,
+        labels=None,
+        mode=None,
+        update_config=None,
+        networks=None,
+        endpoint_config=None,
+        endpoint_spec=None,
+        rollback_config=None,
+    ):
+        if endpoint_config is not None:
+            endpoint_spec = endpoint_config
+        if mode is None:
+            mode = ServiceMode("replicated")
+        elif not isinstance(mode, dict):
+            mode = ServiceMode(mode)
+        headers = {}
+        image = task_template.get("ContainerSpec", {}).get("Image")
+        if image:
+            headers.update(self._auth_header(image))
+        data = {
+            "Name": name,
+            "Labels": labels,
+            "TaskTemplate": task_template,
+            "Mode": mode,
+            "Networks": convert_service_networks(networks),
+            "EndpointSpec": endpoint_spec,
+            "UpdateConfig": update_config,
+            "RollbackConfig": rollback_config,
+        }
+        return await self._call(
+            "POST", "/services/create", body=_strip_none(data), headers=headers
+        )
+
+    async def inspect_service(self, service, insert_defaults=None):
+        params = {}
+        if insert_defaults is not None:
+            params["insertDefaults"] = _bool_param(insert_defaults)
+        return await self._call("GET", f"/services/{_quote(service)}", params=params)
+
+    async def update_service(
+        self,
+        service,
+        version,
+        task_template=None,
+        name=None,
+        labels=None,
+        mode=None,
+        update_config=None,
+        networks=None,
+        endpoint_config=None,
+        endpoint_spec=None,
+        fetch_current_spec=False,
+        rollback_config=None,
+    ):
+        if endpoint_config is not None:
+            endpoint_spec = endpoint_config
+        current = {}
+        if fetch_current_spec:
+            current = (await self.inspect_service(service))["Spec"]
+        if mode is not None and not isinstance(mode, dict):
+            mode = ServiceMode(mode)
+        merged_template = dict(current.get("TaskTemplate", {}))
+        for key, value in (task_template or {}).items():
+            if isinstance(value, dict) and isinstance(merged_template.get(key), dict):
+                value = dict(merged_template[key], **value)
+            merged_template[key] = value
+        if networks is not None:
+            merged_template["Networks"] = convert_service_networks(networks)
+        elif "Networks" not in merged_template and current.get("Networks"):
+            merged_template["Networks"] = current["Networks"]
+        headers = {}
+        image = merged_template.get("ContainerSpec", {}).get("Image")
+        if image:
+            headers.update(self._auth_header(image))
+        data = {
+            "Name": current.get("Name") if name is None else name,
+            "Labels": current.get("Labels") if labels is None else labels,
+            "TaskTemplate": merged_template,
+            "Mode": current.get("Mode") if mode is None else mode,
+            "EndpointSpec": (
+                current.get("EndpointSpec") if endpoint_spec is None else endpoint_spec
+            ),
+            "UpdateConfig": (
+                current.get("UpdateConfig") if update_config is None else update_config
+            ),
+            "RollbackConfig": (
+                current.get("RollbackConfig")
+                if rollback_config is None
+                else rollback_config
+            ),
+        }
+        return await self._call(
+            "POST",
+            f"/services/{_quote(service)}/update",
+            params={"version": version},
+            body=_strip_none(data),
+            headers=headers,
+        )
+
+    async def remove_service(self, service):
+        await self._call("DELETE", f"/services/{_quote(service)}")
+        return True
+
+    async def services(self, filters=None, status=None):
+        params = {"status": status}
+        if filters:
+            params["filters"] = convert_filters(filters)
+        return await self._call("GET", "/services", params=params)
+
+    async def tasks(self, filters=None):
+        params = {}
+        if filters:
+            params["filters"] = convert_filters(filters)
+        return await self._call("GET", "/tasks", params=params)
+
+    async def nodes(self, filters=None):
+        params = {}
+        if filters:
+            params["filters"] = convert_filters(filters)
+        return await self._call("GET", "/nodes", params=params)
+
+    async def create_secret(self, name, data, labels=None, driver=None):
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        body = {
+            "Name": name,
+            "Data": base64.b64encode(data).decode("ascii"),
+            "Labels": labels,
+            "Driver": driver,
+        }
+        return await self._call("POST", "/secrets/create", body=_strip_none(body))
+
+    async def secrets(self, filters=None):
+        params = {}
+        if filters:
+            params["filters"] = convert_filters(filters)
+        return await self._call("GET", "/secrets", params=params)
+
+    async def remove_secret(self, id):
+        await self._call("DELETE", f"/secrets/{_quote(id)}")
+        return True
@@ -0,0 +1,74 @@
+"""
+Batching of stops
+
+When the Hub shuts down, or many idle servers are culled at once,
+stops arrive together.
+Gathering them into batches lets them be run with bounded parallelism
+and reported on together.
+"""
+
+import asyncio
+
+
+class StopBatcher:
+    """Gather stop requests arriving within ``window`` seconds into one batch
+
+    Batches are run by ``stop_all``, a coroutine function
+    called with a list of spawners and ``now``,
+    returning a dict of the exceptions raised by spawner.
+
+    A request arriving while no batch is waiting or running
+    is run right away, as a batch of one,
+    so a lone stop isn't delayed by the window.
+
+    Each request gets a Future resolving when its own spawner has stopped,
+    or raising its own exception.
+    """
+
+    def __init__(self, stop_all, window):
+        self.stop_all = stop_all
+        self.window = window
+        self._batches = {}
+        self._running = 0
+
+    def submit(self, spawner, now=False):
+        """Add a spawner to the next batch, returns a Future"""
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(now)
+        if batch is None or batch["loop"] is not loop:
+            batch = self._batches[now] = {"loop": loop, "futures": {}}
+            if self._batches.keys() == {now} and not self._running:
+                # nothing else to wait for
+                loop.call_soon(self._flush, now, batch)
+            else:
+                loop.call_later(self.window, self._flush, now, batch)
+        f = batch["futures"].get(spawner)
+        if f is None:
+            f = batch["futures"][spawner] = loop.create_future()
+        return f
+
+    def _flush(self, now, batch):
+        if self._batches.get(now) is batch:
+            del self._batches[now]
+        self._running += 1
+        asyncio.ensure_future(self._run(now, batch["futures"]))
+
+    async def _run(self, now, futures):
+        errors = None
+        try:
+            errors = await self.stop_all(list(futures), now=now)
+        except Exception as e:
+            errors = {spawner: e for spawner in futures}
+        finally:
+            self._running -= 1
+            for spawner, f in futures.items():
+                if f.done():
+                    # cancelled
+                    continue
+                if errors is None:
+                    # the batch itself was cancelled
+                    f.cancel()
+                elif spawner in errors:
+                    f.set_exception(errors[spawner])
+                else:
+                    f.set_result(None)
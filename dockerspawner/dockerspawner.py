@@ -3,15 +3,20 @@ A Spawner for JupyterHub that runs each user's server in a separate docker conta
 """
 
 import asyncio
+import copy
+import hashlib
 import inspect
 import json
 import os
 import string
+import threading
+import time
 import warnings
+from collections import Counter, deque
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from io import BytesIO
-from tarfile import TarFile, TarInfo
+from tarfile import DIRTYPE, TarFile, TarInfo
 from textwrap import dedent, indent
 from urllib.parse import urlparse
 
@@ -38,6 +43,23 @@ from traitlets import (
     validate,
 )
 
+from .asyncdocker import AsyncDockerClient
+from .bulkstop import StopBatcher
+from .events import DockerEventWatcher, iter_stream_in_thread
+from .imagecache import ImageCache
+from .metrics import (
+    DOCKER_API_CALL_DURATION_SECONDS,
+    DOCKER_API_CALL_ERRORS,
+    DOCKER_API_CALLS_QUEUED,
+    DOCKER_API_CALLS_RUNNING,
+    IMAGE_PULL_DURATION_SECONDS,
+    SPAWN_PHASE_DURATION_SECONDS,
+)
+from .phases import PhaseGraph
+from .poller import SnapshotPoller, index_containers
+from .pool import WarmPool, can_inject_env, env_exec_kwargs, pool_template
+from .prepuller import ImagePrePuller
+from .pullprogress import PullProgress
 from .volumenamingstrategy import default_format_volume_name
 
 
@@ -74,6 +96,201 @@ def _deep_merge(dest, src):
     return dest
 
 
+def _host_ports(container, private_port):
+    """The host ports bound to a container port, as from ``docker port``"""
+    port_settings = container.get("NetworkSettings", {}).get("Ports")
+    if port_settings is None:
+        return None
+    private_port = str(private_port)
+    if "/" in private_port:
+        return port_settings.get(private_port)
+    for protocol in ("tcp", "udp", "sctp"):
+        host_ports = port_settings.get(f"{private_port}/{protocol}")
+        if host_ports:
+            return host_ports
+    return None
+
+
+def _split_image(image):
+    """Split an image into repo, tag"""
+    # docker wants to split repo:tag
+    # the part split("/")[-1] allows having an image from a custom repo
+    # with port but without tag. For example: my.docker.repo:51150/foo would not
+    # pass this test, resulting in image=my.docker.repo:51150/foo and tag=latest
+    if ':' in image.split("/")[-1]:
+        # rsplit splits from right to left, allowing to have a custom image repo with port
+        repo, tag = image.rsplit(':', 1)
+    else:
+        repo = image
+        tag = 'latest'
+    return repo, tag
+
+
+def _stop_signal(container):
+    """The signal that stops a container, from its inspect output"""
+    return (container.get("Config") or {}).get("StopSignal") or "SIGTERM"
+
+
+# default sizes of the thread pools used for docker calls
+# see DockerSpawner.docker_lanes
+_default_docker_lanes = {
+    "pull": {"threads": 2, "queue": 32},
+    "lifecycle": {"threads": 4, "queue": 64},
+    "read": {"threads": 4, "queue": 256},
+}
+
+# cheap, read-only calls that get their own lane,
+# so that e.g. poll is never stuck behind a pull or stop
+_docker_read_methods = {
+    "configs",
+    "containers",
+    "images",
+    "info",
+    "networks",
+    "nodes",
+    "port",
+    "secrets",
+    "services",
+    "tasks",
+    "version",
+    "volumes",
+}
+
+
+def _docker_lane_name(method):
+    """Return the name of the executor lane for a docker method"""
+    if method == "pull":
+        return "pull"
+    if method.startswith("inspect_") or method in _docker_read_methods:
+        return "read"
+    return "lifecycle"
+
+
+class _Slots:
+    """A counting semaphore for coroutines
+
+    Unlike asyncio.Semaphore, this is never bound to an event loop
+    (instances are shared at the class level)
+    and exposes how many callers are waiting.
+    Low priority callers only get a slot when no other callers are waiting,
+    and never one of the ``reserved`` slots.
+    """
+
+    def __init__(self, limit, reserved=0):
+        self.limit = limit
+        self.reserved = reserved
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self):
+        """The number of callers waiting for a slot"""
+        return len(self._waiters)
+
+    async def acquire(self, low_priority=False):
+        if low_priority:
+            free = self.active < self.limit - self.reserved and not self._waiters
+        else:
+            # low priority waiters may be waiting for an unreserved slot
+            free = self.active < self.limit and not any(
+                not waiter_low_priority for waiter_low_priority, _ in self._waiters
+            )
+        if free:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        item = (low_priority, waiter)
+        if low_priority:
+            self._waiters.append(item)
+        else:
+            # queue ahead of all low priority waiters
+            for i, (waiter_low_priority, _) in enumerate(self._waiters):
+                if waiter_low_priority:
+                    self._waiters.insert(i, item)
+                    break
+            else:
+                self._waiters.append(item)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # we were handed a slot just as we were cancelled,
+                # pass it on
+                self.release()
+            else:
+                self._waiters.remove(item)
+            raise
+
+    def release(self):
+        while self._waiters:
+            low_priority, waiter = self._waiters[0]
+            if low_priority and self.active > self.limit - self.reserved:
+                # the slot we're releasing is reserved
+                break
+            self._waiters.popleft()
+            if not waiter.done():
+                # hand our slot directly to the next waiter
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class _DockerLane:
+    """A thread pool for one kind of docker call
+
+    At most ``threads`` calls run at once,
+    and at most ``queue`` more wait in the executor's queue.
+    Further calls are rejected with a RuntimeError,
+    rather than piling up without bound.
+    """
+
+    def __init__(self, name, threads, queue):
+        self.name = name
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(
+            threads, thread_name_prefix=f"dockerspawner-{name}"
+        )
+        self.slots = _Slots(threads + queue)
+
+    async def submit(self, f, *args, **kwargs):
+        queued = DOCKER_API_CALLS_QUEUED.labels(lane=self.name)
+        running = DOCKER_API_CALLS_RUNNING.labels(lane=self.name)
+        # the call leaves the queue either when it runs or when it is cancelled,
+        # which may race
+        dequeue_lock = threading.Lock()
+        in_queue = True
+
+        def dequeue():
+            nonlocal in_queue
+            with dequeue_lock:
+                if in_queue:
+                    in_queue = False
+                    queued.dec()
+
+        def run():
+            dequeue()
+            running.inc()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                running.dec()
+
+        if self.slots.active >= self.slots.limit:
+            raise RuntimeError(
+                f"Too many docker calls in the {self.name} lane:"
+                f" {self.threads} running, {self.slots.limit - self.threads} queued"
+            )
+        queued.inc()
+        try:
+            await self.slots.acquire()
+            try:
+                return await asyncio.wrap_future(self.executor.submit(run))
+            finally:
+                self.slots.release()
+        finally:
+            dequeue()
+
+
 class DockerSpawner(Spawner):
     """A Spawner for JupyterHub that runs each user's server in a separate docker container"""
 
@@ -86,7 +303,7 @@ class DockerSpawner(Spawner):
             return x(self)
         return x
 
-    _executor = None
+    _lanes = None
 
     _deprecated_aliases = {
         "container_ip": ("host_ip", "0.9.*"),
@@ -118,13 +335,119 @@ class DockerSpawner(Spawner):
             )
             setattr(self, new_attr, change.new)
 
+    docker_lanes = Dict(
+        config=True,
+        help="""Sizes of the thread pools ('lanes') used for docker calls.
+
+        docker-py calls block, so they are run in background threads.
+        Calls are split into lanes, so that slow calls
+        don't hold up cheap ones (e.g. the inspect calls made by ``poll``):
+
+        - pull: image pulls
+        - lifecycle: create, start, stop, remove, and any other call
+        - read: inspect, port, and listing calls
+
+        Each lane is a dict with the keys ``threads``
+        (the number of concurrent calls)
+        and ``queue`` (the number of calls that may wait for a thread).
+        Calls beyond that fail right away with an error,
+        so an overloaded docker daemon doesn't build up an unbounded backlog.
+        Lanes or keys that are not specified keep their default values::
+
+            c.DockerSpawner.docker_lanes = {
+                "pull": {"threads": 2, "queue": 32},
+                "lifecycle": {"threads": 4, "queue": 64},
+                "read": {"threads": 4, "queue": 256},
+            }
+
+        Lanes are shared by all spawners and are created
+        the first time a docker call is made.
+        The docker client's connection pool is sized to match,
+        unless ``max_pool_size`` is set in ``client_kwargs``.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    @validate("docker_lanes")
+    def _validate_docker_lanes(self, proposal):
+        for name, lane in proposal.value.items():
+            if name not in _default_docker_lanes:
+                raise ValueError(
+                    f"Unknown docker lane {name!r}, expected one of {', '.join(_default_docker_lanes)}"
+                )
+            for key, value in lane.items():
+                if key not in {"threads", "queue"}:
+                    raise ValueError(
+                        f"Unknown key {key!r} for docker lane {name!r}, expected 'threads' or 'queue'"
+                    )
+                minimum = 1 if key == "threads" else 0
+                if not isinstance(value, int) or value < minimum:
+                    raise ValueError(
+                        f"docker_lanes[{name!r}][{key!r}] must be an integer >= {minimum}, got {value!r}"
+                    )
+        return proposal.value
+
+    def _get_docker_lane_config(self):
+        """Return the full lane config, with defaults filled in"""
+        lanes = {}
+        for name, default_lane in _default_docker_lanes.items():
+            lanes[name] = dict(default_lane)
+            lanes[name].update(self.docker_lanes.get(name, {}))
+        return lanes
+
     @property
-    def executor(self):
-        """single global executor"""
+    def lanes(self):
+        """The executor lanes for docker calls, by name
+
+        shared by all instances
+        """
         cls = self.__class__
-        if cls._executor is None:
-            cls._executor = ThreadPoolExecutor(1)
-        return cls._executor
+        if cls._lanes is None:
+            cls._lanes = {
+                name: _DockerLane(name, **lane)
+                for name, lane in self._get_docker_lane_config().items()
+            }
+        return cls._lanes
+
+    @property
+    def executor(self):
+        """The executor for lifecycle docker calls
+
+        Other calls use :attr:`lanes`.
+        """
+        return self.lanes["lifecycle"].executor
+
+    docker_backend = CaselessStrEnum(
+        ["threads", "asyncio"],
+        default_value="threads",
+        config=True,
+        help="""How to talk to the Docker API.
+
+        - threads: use docker-py, running each blocking call
+          in a thread (see ``docker_lanes``)
+        - asyncio: use dockerspawner's own asyncio client,
+          which makes the calls directly on the Hub's event loop.
+          Supports unix socket and tcp (with TLS) connections,
+          configured with the same ``tls_config``, ``client_kwargs``
+          and ``DOCKER_HOST`` environment variables as docker-py.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    def _get_client_kwargs(self):
+        """Keyword arguments for the docker client constructor"""
+        # one connection per thread that may be making calls
+        max_pool_size = sum(
+            lane["threads"] for lane in self._get_docker_lane_config().values()
+        )
+        kwargs = {"version": "auto", "max_pool_size": max_pool_size}
+        if self.tls_config:
+            kwargs["tls"] = docker.tls.TLSConfig(**self.tls_config)
+        kwargs.update(kwargs_from_env())
+        kwargs.update(self.client_kwargs)
+        return kwargs
 
     _client = None
 
@@ -133,15 +456,36 @@ class DockerSpawner(Spawner):
         """single global client instance"""
         cls = self.__class__
         if cls._client is None:
-            kwargs = {"version": "auto"}
-            if self.tls_config:
-                kwargs["tls"] = docker.tls.TLSConfig(**self.tls_config)
-            kwargs.update(kwargs_from_env())
-            kwargs.update(self.client_kwargs)
-            client = docker.APIClient(**kwargs)
+            client = docker.APIClient(**self._get_client_kwargs())
             cls._client = client
         return cls._client
 
+    _async_client = None
+
+    @property
+    def async_client(self):
+        """single global asyncio client instance
+
+        used when ``docker_backend = "asyncio"``
+        """
+        cls = self.__class__
+        if cls._async_client is None:
+            cls._async_client = AsyncDockerClient(**self._get_client_kwargs())
+        return cls._async_client
+
+    @property
+    def docker_base_url(self):
+        """The base url of the docker client in use"""
+        if self.docker_backend == "asyncio":
+            return self.async_client.base_url
+        return self.client.base_url
+
+    def create_host_config(self, **kwargs):
+        """Create a host config dict for create_container"""
+        if self.docker_backend == "asyncio":
+            return self.async_client.create_host_config(**kwargs)
+        return self.client.create_host_config(**kwargs)
+
     @default("cmd")
     def _default_cmd(self):
         # no default means use the image command
@@ -451,40 +795,169 @@ class DockerSpawner(Spawner):
 
         Busybox is used because we just need an empty container
         that waits while we stage files into the volume via .put_archive.
+
+        Only used with ``certs_staging = 'volume'``.
+        """,
+    )
+
+    certs_staging = CaselessStrEnum(
+        ["container", "volume"],
+        default_value="container",
+        config=True,
+        help="""How internal SSL certificates get into containers.
+
+        - container: written directly into the user's container in /certs,
+          after it is created and before it starts.
+          Containers created with 'volume' staging
+          (or before this option was added) keep getting their certs
+          in the volume they have mounted in /certs.
+        - volume: staged in the ``certs_volume_name`` volume,
+          mounted in /certs, with a helper container
+          running ``move_certs_image``.
+
+        Certs are not staged again if they are the same as
+        the certs already in the container or volume,
+        according to a hash of their content
+        and where they were staged, kept in state.
+
+        .. versionadded:: 14.1
         """,
     )
 
+    # where the certs were staged last ('container' or 'volume'),
+    # and a hash of their content
+    certs_hash = None
+    # coroutine function staging the certs, run as a phase of start
+    _certs_staging = None
+    # certs to put in the container, with certs_staging = 'container'
+    _certs_pending = None
+    # whether the certs must be staged before the server is created
+    _certs_before_create = False
+    # whether the certs must be staged after looking for an existing server
+    _certs_after_object = False
+
     async def move_certs(self, paths):
-        self.log.info("Staging internal ssl certs for %s", self._log_name)
-        await self.pull_image(self.move_certs_image)
-        # create the volume
-        volume_name = self.format_volume_name(self.certs_volume_name, self)
-        # create volume passes even if it already exists
-        self.log.info("Creating ssl volume %s for %s", volume_name, self._log_name)
-        await self.docker('create_volume', volume_name)
+        """Stage internal ssl certs
 
-        # create a tar archive of the internal cert files
-        # docker.put_archive takes a tarfile and a running container
-        # and unpacks the archive into the container
+        Returns the paths of the certs in the container right away.
+        With ``certs_staging = 'volume'``, the certs are staged
+        in a phase of start, concurrently with the phases that don't need them.
+        With ``certs_staging = 'container'``, they are put in the container
+        once it has been created.
+        """
+        files, nb_paths = self._read_certs(paths)
+        certs_hash = self._hash_certs(files)
+        if self.certs_staging == "container":
+            self._certs_pending = (files, certs_hash)
+        elif ["volume", certs_hash] == self.certs_hash:
+            self.log.info("Internal ssl certs for %s are unchanged", self._log_name)
+        else:
+            self._certs_staging = partial(
+                self._stage_certs, self._certs_archive(files), certs_hash
+            )
+        return nb_paths
+
+    async def _run_certs_staging(self):
+        staging, self._certs_staging = self._certs_staging, None
+        await staging()
+
+    def _read_certs(self, paths):
+        """Read the internal cert files
+
+        Returns their content and mtime by file name,
+        and the paths of the certs in the container.
+        """
+        files = {}
         nb_paths = {}
-        tar_buf = BytesIO()
-        archive = TarFile(fileobj=tar_buf, mode='w')
         for key, hub_path in paths.items():
             fname = os.path.basename(hub_path)
             nb_paths[key] = '/certs/' + fname
             with open(hub_path, 'rb') as f:
                 content = f.read()
-            tarinfo = TarInfo(name=fname)
+            files[fname] = (content, os.stat(hub_path).st_mtime)
+        return files, nb_paths
+
+    @staticmethod
+    def _hash_certs(files):
+        h = hashlib.sha256()
+        for fname, (content, _mtime) in sorted(files.items()):
+            h.update(fname.encode("utf8") + b"\0" + content + b"\0")
+        return h.hexdigest()
+
+    def _certs_archive(self, files, dirname=None):
+        """Create a tar archive of the internal cert files
+
+        With ``dirname``, the files are in that directory in the archive.
+        """
+        # docker.put_archive takes a tarfile and a container
+        # and unpacks the archive into the container
+        tar_buf = BytesIO()
+        archive = TarFile(fileobj=tar_buf, mode='w')
+        prefix = ""
+        if dirname:
+            prefix = dirname + "/"
+            tarinfo = TarInfo(name=dirname)
+            tarinfo.type = DIRTYPE
+            tarinfo.mode = 0o755
+            tarinfo.mtime = time.time()
+            archive.addfile(tarinfo)
+        for fname, (content, mtime) in files.items():
+            tarinfo = TarInfo(name=prefix + fname)
             tarinfo.size = len(content)
-            tarinfo.mtime = os.stat(hub_path).st_mtime
+            tarinfo.mtime = mtime
             tarinfo.mode = 0o644
             archive.addfile(tarinfo, BytesIO(content))
         archive.close()
         tar_buf.seek(0)
+        return tar_buf
+
+    async def _put_certs_in_container(self):
+        """Put the internal ssl certs in the created container"""
+        files, certs_hash = self._certs_pending
+        self._certs_pending = None
+        memo = self._start_memo
+        existing = memo["object"]
+        # mounted read-only in containers created with certs_staging = 'volume'
+        volume = None
+        if existing is not None:
+            if memo["paused"]:
+                # the server is still running, with the certs it loaded
+                return
+            for mount in existing.get("Mounts") or []:
+                if mount.get("Destination") == "/certs":
+                    volume = mount.get("Name") or mount.get("Source")
+            mode = "volume" if volume else "container"
+            if [mode, certs_hash] == self.certs_hash:
+                self.log.info("Internal ssl certs for %s are unchanged", self._log_name)
+                return
+        if volume:
+            await self._stage_certs(
+                self._certs_archive(files), certs_hash, volume_name=volume
+            )
+            return
+        self.log.info("Putting internal ssl certs in container for %s", self._log_name)
+        await self.docker(
+            'put_archive',
+            container=self.object_id,
+            path='/',
+            data=self._certs_archive(files, dirname="certs"),
+        )
+        self.certs_hash = ["container", certs_hash]
+
+    async def _stage_certs(self, tar_buf, certs_hash=None, volume_name=None):
+        self.log.info("Staging internal ssl certs for %s", self._log_name)
+        # not the pull users wait for, don't report it
+        await self.pull_image(self.move_certs_image, report_progress=False)
+        # create the volume
+        if volume_name is None:
+            volume_name = self.format_volume_name(self.certs_volume_name, self)
+        # create volume passes even if it already exists
+        self.log.info("Creating ssl volume %s for %s", volume_name, self._log_name)
+        await self.docker('create_volume', volume_name)
 
         # run a container to stage the certs,
         # mounting the volume at /certs/
-        host_config = self.client.create_host_config(
+        host_config = self.create_host_config(
             binds={
                 volume_name: {"bind": "/certs", "mode": "rw"},
             },
@@ -514,7 +987,7 @@ class DockerSpawner(Spawner):
             )
         finally:
             await self.docker('remove_container', container_id)
-        return nb_paths
+        self.certs_hash = ["volume", certs_hash]
 
     certs_volume_name = Unicode(
         "{prefix}ssl-{username}",
@@ -604,7 +1077,58 @@ class DockerSpawner(Spawner):
     def will_resume(self):
         # indicate that we will resume,
         # so JupyterHub >= 0.7.1 won't cleanup our API token
-        return not self.remove
+        return not self.remove or self.stop_mode == "pause"
+
+    stop_mode = CaselessStrEnum(
+        ["stop", "pause"],
+        default_value="stop",
+        config=True,
+        help="""What to do with containers when servers are stopped.
+
+        - stop: stop the container (and remove it if ``remove = True``)
+        - pause: pause the container, freezing its processes.
+          Starting the server again unpauses it,
+          which takes milliseconds and keeps kernels and their state.
+          Paused containers still hold their memory.
+          They are stopped for real after ``pause_timeout``.
+
+        Paused containers are reported as stopped by ``poll``
+        in pause mode.
+        Ignored by SwarmSpawner, which has ``suspend_services`` instead.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    pause_timeout = Float(
+        3600,
+        config=True,
+        help="""Stop containers that have been paused for this many seconds.
+
+        Only used with ``stop_mode = 'pause'``.
+        Containers are stopped (and removed if ``remove = True``)
+        as they would have been with ``stop_mode = 'stop'``.
+        0 means paused containers are never stopped.
+
+        The time a container was paused is kept in the server's state.
+        When the Hub restarts, containers paused before it
+        are found by a sweep when the first server is loaded,
+        and stopped ``pause_timeout`` after that
+        (or after they were paused, if their server is loaded).
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # when the container was paused, as a timestamp
+    paused_at = None
+    _pause_timer = None
+    # the API token of the paused container,
+    # which JupyterHub replaces before the next start
+    _paused_api_token = ""
+    # sweeps for containers paused before the Hub started,
+    # by docker url and filters
+    _paused_sweeps = {}
 
     extra_create_kwargs = Union(
         [Callable(), Dict()],
@@ -786,8 +1310,10 @@ class DockerSpawner(Spawner):
         e.g. calling 'docker exec'
         """
 
-        container = await self.get_object()
-        container_id = container[self.object_id_key]
+        container_id = self.object_id
+        if not container_id:
+            container = await self.get_object()
+            container_id = container[self.object_id_key]
 
         exec_kwargs = {'cmd': self.post_start_cmd, 'container': container_id}
         self.log.debug(
@@ -869,7 +1395,7 @@ class DockerSpawner(Spawner):
         read_only_volumes = {}
         # FIXME: replace getattr with self.internal_ssl
         # when minimum jupyterhub is 1.0
-        if getattr(self, 'internal_ssl', False):
+        if getattr(self, 'internal_ssl', False) and self.certs_staging == "volume":
             # add SSL volume as read-only
             read_only_volumes[self.certs_volume_name] = '/certs'
         read_only_volumes.update(self.read_only_volumes)
@@ -923,6 +1449,10 @@ class DockerSpawner(Spawner):
         # override object_name from state if defined
         # to avoid losing track of running servers
         self.object_name = state.get("object_name", None) or self.object_name
+        self.paused_at = state.get("paused_at")
+        self.certs_hash = state.get("certs_hash")
+        if self.paused_at and self.object_id:
+            self._rearm_pause_timeout()
 
         if self.object_id:
             self.log.debug(
@@ -937,10 +1467,15 @@ class DockerSpawner(Spawner):
             # persist object_name if running
             # so that a change in the template doesn't lose track of running servers
             state["object_name"] = self.object_name
+            if self.paused_at:
+                state["paused_at"] = self.paused_at
             self.log.debug(
                 f"Persisting state for {self._log_name}: {self.object_type}"
                 f" name={self.object_name}, id={self.object_id}"
             )
+        if self.certs_hash:
+            # the certs volume outlives the container
+            state["certs_hash"] = self.certs_hash
         return state
 
     def _env_keep_default(self):
@@ -960,17 +1495,365 @@ class DockerSpawner(Spawner):
         m = getattr(self.client, method)
         return m(*args, **kwargs)
 
+    coalesce_docker_calls = Bool(
+        False,
+        config=True,
+        help="""Share identical read-only docker calls that are already in flight.
+
+        When enabled, a call to one of ``coalesce_methods``
+        with the same arguments as a call that has not finished yet
+        waits for that call instead of making a new one.
+        This helps when many servers start from the same image at once.
+
+        Hit and miss counts are available in
+        ``DockerSpawner.coalesce_hits`` and ``DockerSpawner.coalesce_misses``,
+        by method.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    coalesce_methods = List(
+        Unicode(),
+        default_value=[
+            "containers",
+            "inspect_container",
+            "inspect_image",
+            "inspect_service",
+            "inspect_volume",
+            "port",
+            "services",
+            "tasks",
+        ],
+        config=True,
+        help="""Docker methods that may be coalesced with ``coalesce_docker_calls``.
+
+        Only read-only methods should be listed here.
+        Each caller gets its own copy of a shared result.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # docker calls made by this spawner during its current or last start,
+    # by method
+    docker_calls = None
+
+    # docker calls in flight, for coalescing
+    _inflight_docker_calls = {}
+    # coalescing counters, by method
+    coalesce_hits = Counter()
+    coalesce_misses = Counter()
+
     def docker(self, method, *args, **kwargs):
         """Call a docker method in a background thread
 
+        The call runs in the lane for its method (see ``docker_lanes``),
+        or on the event loop with ``docker_backend = "asyncio"``.
+
+        Identical calls may share a result with ``coalesce_docker_calls``.
+
         returns a Future
         """
-        return asyncio.wrap_future(
-            self.executor.submit(self._docker, method, *args, **kwargs)
+        if self._start_memo is not None:
+            # count calls during start
+            self.docker_calls[method] += 1
+        if not (self.coalesce_docker_calls and method in self.coalesce_methods):
+            return self._docker_future(method, *args, **kwargs)
+
+        # calls are only identical if they go to the same client
+        client = self.async_client if self.docker_backend == "asyncio" else self.client
+        key = (client, repr((method, args, sorted(kwargs.items()))))
+        inflight = self._inflight_docker_calls
+        f = inflight.get(key)
+        if f is not None and f.get_loop() is asyncio.get_running_loop():
+            self.coalesce_hits[method] += 1
+        else:
+            self.coalesce_misses[method] += 1
+            f = inflight[key] = self._docker_future(method, *args, **kwargs)
+
+            def _done(f):
+                if inflight.get(key) is f:
+                    del inflight[key]
+
+            f.add_done_callback(_done)
+        return asyncio.ensure_future(self._coalesced_result(f))
+
+    @staticmethod
+    async def _coalesced_result(f):
+        """Wait for a shared docker call, returning a copy of its result"""
+        # shield, so one cancelled caller doesn't cancel the call for everyone
+        result = await asyncio.shield(f)
+        # copy, so callers can't modify each other's results
+        return copy.deepcopy(result)
+
+    def _shared_docker(self):
+        """A docker call function that isn't tied to this spawner
+
+        for helpers shared by all spawners, e.g. the warm pool.
+        Its calls use the same client and lanes as :meth:`docker`,
+        but don't count towards this spawner's ``docker_calls``,
+        and it doesn't keep this spawner alive.
+        """
+        cls = self.__class__
+        if self.docker_backend == "asyncio":
+            client = self.async_client
+
+            def call(method, *args, **kwargs):
+                m = getattr(client, method)
+                return cls._running_async_call(m(*args, **kwargs))
+
+        else:
+            client = self.client
+            lanes = self.lanes
+
+            def call(method, *args, **kwargs):
+                lane = lanes[_docker_lane_name(method)]
+                return lane.submit(getattr(client, method), *args, **kwargs)
+
+        def docker(method, *args, **kwargs):
+            call_f = call(method, *args, **kwargs)
+            return asyncio.ensure_future(cls._observe_docker_call(method, call_f))
+
+        return docker
+
+    def _docker_future(self, method, *args, **kwargs):
+        """Make a docker call, returns a Future"""
+        if self.docker_backend == "asyncio":
+            m = getattr(self.async_client, method, None)
+            if m is None:
+                raise NotImplementedError(
+                    f"{method} is not implemented by the asyncio docker backend"
+                )
+            call = self._running_async_call(m(*args, **kwargs))
+        else:
+            lane = self.lanes[_docker_lane_name(method)]
+            call = lane.submit(self._docker, method, *args, **kwargs)
+        return asyncio.ensure_future(self._observe_docker_call(method, call))
+
+    @staticmethod
+    async def _running_async_call(call):
+        running = DOCKER_API_CALLS_RUNNING.labels(lane="asyncio")
+        running.inc()
+        try:
+            return await call
+        finally:
+            running.dec()
+
+    @staticmethod
+    async def _observe_docker_call(method, call):
+        """Record the duration and errors of a docker call in metrics"""
+        start = time.perf_counter()
+        try:
+            return await call
+        except APIError as e:
+            DOCKER_API_CALL_ERRORS.labels(
+                method=method, status=str(e.status_code or "none")
+            ).inc()
+            raise
+        except Exception:
+            # no response, e.g. connection errors
+            DOCKER_API_CALL_ERRORS.labels(method=method, status="none").inc()
+            raise
+        finally:
+            DOCKER_API_CALL_DURATION_SECONDS.labels(method=method).observe(
+                time.perf_counter() - start
+            )
+
+    batch_poll = Bool(
+        False,
+        config=True,
+        help="""Answer ``poll`` from a single container listing shared by all spawners.
+
+        Instead of one inspect call per server per poll interval,
+        one ``docker ps``-style listing (filtered by ``batch_poll_filters``)
+        is made at most every ``batch_poll_max_age`` seconds,
+        and each spawner looks itself up in that listing.
+        Containers missing from the listing, or not running,
+        are still inspected individually to get their exit status.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    batch_poll_max_age = Float(
+        5,
+        config=True,
+        help="""Maximum age (in seconds) of the shared listing used with ``batch_poll``.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    batch_poll_filters = Dict(
+        config=True,
+        help="""Filters for the container listing used with ``batch_poll``.
+
+        Any filters accepted by ``docker ps --filter``.
+        The default lists containers whose name contains ``prefix``.
+        Use e.g. a ``label`` filter if your containers are labeled.
+
+        These filters also select the containers tracked with ``watch_events``.
+        With SwarmSpawner, they filter the listing of tasks,
+        where ``name`` matches task names by prefix.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    @default("batch_poll_filters")
+    def _default_batch_poll_filters(self):
+        return {"name": self.prefix}
+
+    # shared pollers, by filters
+    _container_pollers = {}
+
+    def _get_container_poller(self):
+        key = json.dumps(self.batch_poll_filters, sort_keys=True)
+        pollers = self._container_pollers
+        if key not in pollers:
+            pollers[key] = SnapshotPoller(max_age=self.batch_poll_max_age)
+        return pollers[key]
+
+    async def _list_containers(self):
+        containers = await self.docker(
+            "containers", all=True, filters=self.batch_poll_filters
+        )
+        return index_containers(containers)
+
+    async def _get_listed_container(self):
+        """Look up my container in the shared listing
+
+        Returns None if it is not listed.
+        """
+        poller = self._get_container_poller()
+        try:
+            listing = await poller.get(self._list_containers)
+        except Exception as e:
+            self.log.warning("Failed to list containers for polling: %s", e)
+            return None
+        container = None
+        if self.object_id:
+            container = listing.get(self.object_id)
+        if container is None:
+            container = listing.get(self.object_name)
+        return container
+
+    watch_events = Bool(
+        False,
+        config=True,
+        help="""Track container state from the docker events stream.
+
+        A background task follows ``docker events`` for the containers
+        selected by ``batch_poll_filters``,
+        and keeps a table of their state (running, exit code, health).
+        ``poll`` and ``get_object`` are answered from that table
+        without API calls, and containers that exit are noticed right away.
+
+        The table is rebuilt from a full listing whenever the stream (re)connects,
+        and is not used while the stream is disconnected.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # shared event watchers, by filters
+    _event_watchers = {}
+
+    def _get_event_filters(self):
+        """Filters for the docker events stream"""
+        filters = {"type": ["container"]}
+        if self.image_cache_ttl:
+            filters["type"].append("image")
+        if "label" in self.batch_poll_filters:
+            filters["label"] = self.batch_poll_filters["label"]
+        return filters
+
+    def _shared_docker_events(self):
+        """A function connecting to the docker events stream
+
+        that isn't tied to this spawner, like :meth:`_shared_docker`.
+        It is a coroutine function, given event filters,
+        returning an async iterator of events.
+        """
+        if self.docker_backend == "asyncio":
+            client = self.async_client
+
+            async def events(filters):
+                return await client.events(filters=filters, decode=True)
+
+        else:
+            docker = self._shared_docker()
+
+            async def events(filters):
+                stream = await docker("events", filters=filters, decode=True)
+                return iter_stream_in_thread(stream)
+
+        return events
+
+    @property
+    def event_watcher(self):
+        """The shared docker event watcher
+
+        None unless ``watch_events`` is enabled.
+        """
+        if not self.watch_events:
+            return None
+        filters = self._get_event_filters()
+        key = json.dumps(
+            [self.docker_base_url, filters, self.batch_poll_filters], sort_keys=True
         )
+        watchers = self._event_watchers
+        if key not in watchers:
+            # the watcher outlives this spawner, don't keep a reference to it
+            docker = self._shared_docker()
+            list_filters = self.batch_poll_filters
+
+            async def list_containers():
+                return await docker("containers", all=True, filters=list_filters)
+
+            cache = self.image_cache
+            watchers[key] = DockerEventWatcher(
+                events=self._shared_docker_events(),
+                list_containers=list_containers,
+                filters=filters,
+                name_pattern=list_filters.get("name"),
+                log=self.log,
+                on_image_event=(
+                    partial(self._handle_image_event, cache)
+                    if cache is not None
+                    else None
+                ),
+                list_filters=list_filters,
+            )
+        watcher = watchers[key]
+        watcher.start()
+        return watcher
 
     async def poll(self):
         """Check for my id in ``docker ps``"""
+        watcher = self.event_watcher
+        if watcher:
+            entry = watcher.lookup(self.object_id or self.object_name)
+            if entry and entry["State"].get("Running"):
+                self.object_id = entry["Id"]
+                return self._poll_running(entry["State"].get("Paused"))
+            if entry and "ExitCode" in entry["State"]:
+                return (
+                    "ExitCode={ExitCode}, "
+                    "Error='{Error}', "
+                    "FinishedAt={FinishedAt}".format(**entry["State"])
+                )
+            # not enough information, ask docker
+
+        if self.batch_poll:
+            listed = await self._get_listed_container()
+            # docker inspect also reports paused and restarting containers as running
+            if listed and listed.get("State") in {"running", "paused", "restarting"}:
+                self.object_id = listed["Id"]
+                return self._poll_running(listed["State"] == "paused")
+            # not running or not listed, inspect for the exit status
+
         container = await self.get_object()
         if not container:
             self.log.warning("Container not found: %s", self.container_name)
@@ -984,7 +1867,7 @@ class DockerSpawner(Spawner):
         )
 
         if container_state["Running"]:
-            return None
+            return self._poll_running(container_state.get("Paused"))
 
         else:
             return (
@@ -993,11 +1876,39 @@ class DockerSpawner(Spawner):
                 "FinishedAt={FinishedAt}".format(**container_state)
             )
 
+    def _poll_running(self, paused):
+        """poll result for a running container
+
+        Paused containers are stopped servers with stop_mode = 'pause'.
+        """
+        if paused and self.stop_mode == "pause":
+            # e.g. after a restart of the Hub
+            self._schedule_pause_timeout()
+            return "Paused"
+        return None
+
     async def get_object(self):
         self.log.debug("Getting %s '%s'", self.object_type, self.object_name)
+        watcher = self.event_watcher if self.object_type == "container" else None
+        if watcher:
+            entry = watcher.lookup(self.object_id or self.object_name)
+            obj = watcher.get_object(entry["Id"]) if entry else None
+            if obj:
+                self.object_id = obj[self.object_id_key]
+                self._stop_signal = _stop_signal(obj)
+                return obj
+            if entry is None and watcher.knows_all(self.object_name):
+                # no such container, no need to ask
+                self.object_id = ""
+                return None
+
         try:
             obj = await self.docker("inspect_%s" % self.object_type, self.object_name)
             self.object_id = obj[self.object_id_key]
+            if self.object_type == "container":
+                self._stop_signal = _stop_signal(obj)
+            if watcher:
+                watcher.remember(obj)
         except APIError as e:
             if e.response.status_code == 404:
                 self.log.info(
@@ -1020,12 +1931,88 @@ class DockerSpawner(Spawner):
 
         return obj
 
+    image_cache_ttl = Float(
+        0,
+        config=True,
+        help="""Cache image metadata for this many seconds.
+
+        Image presence (for ``pull_policy``) and the image's default command
+        (when ``cmd`` is not set) are looked up with an inspect call on every start.
+        With a cache, starts from an image that was recently inspected skip these calls.
+
+        Cached entries are dropped when the image is pulled,
+        and, with ``watch_events``, when the image is deleted or re-tagged.
+        Note that image events are not seen if ``batch_poll_filters``
+        includes a ``label`` filter that images don't match.
+
+        0 (default) disables the cache.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    image_cache_size = Int(
+        256,
+        config=True,
+        help="""Maximum number of entries in the image metadata cache.
+
+        Least recently used entries are evicted first.
+        See ``image_cache_ttl``.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # image caches, by docker url
+    _image_caches = {}
+
+    @property
+    def image_cache(self):
+        """The image metadata cache for our docker daemon
+
+        None unless ``image_cache_ttl`` is set.
+        """
+        if not self.image_cache_ttl:
+            return None
+        docker_url = self.docker_base_url
+        cache = self._image_caches.get(docker_url)
+        if cache is None:
+            cache = self._image_caches[docker_url] = ImageCache(
+                ttl=self.image_cache_ttl, max_size=self.image_cache_size
+            )
+        return cache
+
+    @staticmethod
+    def _handle_image_event(cache, action, image_id, attributes):
+        """Invalidate cached image metadata on image events"""
+        if action in {"delete", "untag"}:
+            cache.invalidate(image_id)
+        name = attributes.get("name")
+        if name:
+            cache.invalidate(name)
+
+    async def inspect_image(self, image):
+        """Inspect an image, using the image metadata cache if enabled
+
+        With the cache enabled, only the fields
+        Id, RepoTags, RepoDigests, Config.Cmd and Config.Entrypoint are available.
+        """
+        cache = self.image_cache
+        if cache is not None:
+            image_info = cache.get(image)
+            if image_info is not None:
+                return image_info
+        image_info = await self.docker("inspect_image", image)
+        if cache is not None:
+            image_info = cache.put(image, image_info)
+        return image_info
+
     async def get_command(self):
         """Get the command to run (full command + args)"""
         if self.cmd:
             cmd = self.cmd
         else:
-            image_info = await self.docker("inspect_image", self.image)
+            image_info = await self.inspect_image(self.image)
             cmd = image_info["Config"]["Cmd"]
         return cmd + self.get_args()
 
@@ -1125,14 +2112,19 @@ class DockerSpawner(Spawner):
 
     async def create_object(self):
         """Create the container/service object"""
+        create_kwargs = await self._get_create_kwargs()
+        # create the container
+        obj = await self.docker("create_container", **create_kwargs)
+        return obj
 
-        create_kwargs = dict(
-            image=self.image,
-            environment=self.get_env(),
-            volumes=self.volume_mount_points,
-            name=self.container_name,
-            command=(await self.get_command()),
-        )
+    async def _get_extra_options(self):
+        """Evaluate and render extra_create_kwargs and extra_host_config
+
+        computed once per start
+        """
+        memo = self._start_memo
+        if memo is not None and "extra_options" in memo:
+            return memo["extra_options"]
         extra_create_kwargs = self._eval_if_callable(self.extra_create_kwargs)
         if inspect.isawaitable(extra_create_kwargs):
             extra_create_kwargs = await extra_create_kwargs
@@ -1141,6 +2133,22 @@ class DockerSpawner(Spawner):
         if inspect.isawaitable(extra_host_config):
             extra_host_config = await extra_host_config
         extra_host_config = self._render_templates(extra_host_config)
+        if memo is not None:
+            memo["extra_options"] = (extra_create_kwargs, extra_host_config)
+        return extra_create_kwargs, extra_host_config
+
+    async def _get_create_kwargs(self):
+        """The arguments for create_container"""
+        create_kwargs = dict(
+            image=self.image,
+            environment=self.get_env(),
+            volumes=self.volume_mount_points,
+            name=self.container_name,
+            command=(await self._get_start_command()),
+        )
+        extra_create_kwargs, extra_host_config = copy.deepcopy(
+            await self._get_extra_options()
+        )
 
         # ensure internal port is exposed
         create_kwargs["ports"] = {"%i/tcp" % self.port: None}
@@ -1186,12 +2194,128 @@ class DockerSpawner(Spawner):
 
         self.log.debug("Starting host with config: %s", host_config)
 
-        host_config = self.client.create_host_config(**host_config)
+        host_config = self.create_host_config(**host_config)
         create_kwargs.setdefault("host_config", {}).update(host_config)
+        return create_kwargs
 
-        # create the container
-        obj = await self.docker("create_container", **create_kwargs)
-        return obj
+    warm_pool_size = Int(
+        0,
+        config=True,
+        help="""Number of running containers to keep ready to be claimed by spawns.
+
+        Claiming a container from the pool only renames it
+        and passes it the user's environment,
+        instead of creating and starting a new container.
+        The environment is written by ``docker exec`` to a file
+        only the container's user can read,
+        which a ``/bin/sh`` wrapper around the command reads and removes,
+        so the image must have ``/bin/sh``.
+
+        Pools are kept per image and container options
+        (``extra_create_kwargs``, ``extra_host_config``, limits, etc.).
+        Each pool is filled in the background the first time a spawn uses it,
+        and refilled after every claim.
+        So the first spawn with a given image and options
+        (e.g. the first after the Hub starts) never gets a warm container.
+
+        The warm pool is only used with ``remove = True``,
+        and without per-user ``volumes``, ``read_only_volumes``, ``mounts``
+        or internal SSL.
+
+        0 (default) disables the warm pool.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    warm_pool_max_containers = Int(
+        20,
+        config=True,
+        help="""Maximum number of warm pool containers on a docker daemon, across all pools.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    warm_pool_idle_timeout = Float(
+        3600,
+        config=True,
+        help="""Remove a warm pool's containers when no spawn has used it for this many seconds.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # warm pools, by docker url
+    _warm_pools = {}
+
+    @property
+    def warm_pool(self):
+        docker_url = self.docker_base_url
+        pool = self._warm_pools.get(docker_url)
+        if pool is None:
+            pool = self._warm_pools[docker_url] = WarmPool(
+                docker=self._shared_docker(),
+                log=self.log,
+                name_prefix=f"{self.prefix}-pool",
+                size=self.warm_pool_size,
+                max_containers=self.warm_pool_max_containers,
+                idle_timeout=self.warm_pool_idle_timeout,
+            )
+        return pool
+
+    def _use_warm_pool(self):
+        """Whether this spawner can claim a container from the warm pool"""
+        return (
+            self.warm_pool_size > 0
+            and self.object_type == "container"
+            and self.remove
+            and self.stop_mode == "stop"
+            and not (self.volumes or self.read_only_volumes or self.mounts)
+            and not getattr(self, "internal_ssl", False)
+        )
+
+    async def claim_warm_container(self):
+        """Claim a running container from the warm pool
+
+        Sets object_id and returns True if a container was claimed.
+        """
+        create_kwargs = await self._get_create_kwargs()
+        env = create_kwargs["environment"]
+        if not can_inject_env(env):
+            self.log.warning(
+                "Not using warm pool for %s: environment has invalid names",
+                self._log_name,
+            )
+            return False
+        key, template = pool_template(create_kwargs)
+        pool = self.warm_pool
+        container_id = pool.claim(key, template)
+        if container_id is None:
+            self.log.info("No container ready in warm pool %s", key)
+            return False
+        try:
+            await self.docker("rename", container_id, self.container_name)
+            exec_id = await self.docker(
+                "exec_create", **env_exec_kwargs(container_id, env)
+            )
+            output = await self.docker("exec_start", exec_id=exec_id)
+            if output.strip() != b"ok":
+                raise ValueError(
+                    "Failed to pass environment: %s"
+                    % output.decode("utf8", "replace").strip()
+                )
+        except (APIError, ValueError) as e:
+            self.log.warning(
+                "Failed to claim container %s from warm pool %s: %s",
+                container_id[:7],
+                key,
+                e,
+            )
+            pool.discard(container_id)
+            return False
+        self.object_id = container_id
+        return True
 
     async def start_object(self):
         """Actually start the container/service
@@ -1200,23 +2324,245 @@ class DockerSpawner(Spawner):
         """
         await self.docker("start", self.container_id)
 
+    stop_grace_period = Float(
+        10,
+        config=True,
+        help="""Seconds to wait for a container to exit after its stop signal.
+
+        Containers still running after this long are killed with SIGKILL.
+        The stop signal is the image's ``STOPSIGNAL``, or SIGTERM.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # the container's stop signal, from when it was last inspected
+    _stop_signal = None
+
     async def stop_object(self):
         """Stop the container/service
 
         e.g. calling ``docker stop``. Does not remove the container.
+
+        Sends the stop signal and waits for the container to exit,
+        without holding a thread like ``docker stop`` does,
+        then kills it if it is still running after ``stop_grace_period``.
+        The container is only inspected for its stop signal
+        if it hasn't been already (e.g. by ``poll``).
+        """
+        stop_signal = self._stop_signal
+        if stop_signal is None:
+            container = await self.get_object()
+            if container is None:
+                self.log.debug(
+                    "Already removed %s: %s", self.object_type, self.object_name
+                )
+                return
+            if not container["State"]["Running"]:
+                return
+            stop_signal = self._stop_signal
+        if not await self._kill(stop_signal):
+            return
+        if await self._wait_for_exit(self.stop_grace_period):
+            return
+        self.log.warning(
+            "%s %s (id: %s) did not exit %is after %s, killing it",
+            self.object_type,
+            self.object_name,
+            self.object_id[:7],
+            self.stop_grace_period,
+            stop_signal,
+        )
+        if await self._kill("SIGKILL"):
+            await self._wait_for_exit(self.stop_grace_period)
+
+    async def _kill(self, signal):
+        """Send a signal to the container
+
+        Returns False if it is no longer running.
         """
         try:
-            await self.docker("stop", self.container_id)
+            await self.docker("kill", self.container_id, signal=signal)
         except APIError as e:
             if e.status_code == 404:
                 self.log.debug(
                     "Already removed %s: %s", self.object_type, self.object_id
                 )
-                return
+                self.object_id = ""
+                return False
+            elif e.status_code == 409:
+                # not running
+                return False
             else:
                 raise
+        return True
+
+    async def _wait_for_exit(self, timeout):
+        """Wait for the container to exit, without holding a thread
+
+        Uses the events stream with ``watch_events``,
+        ``docker wait`` with the asyncio backend,
+        or else polls ``docker inspect``.
+
+        Returns whether it exited within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        watcher = self.event_watcher
+        if self.docker_backend == "asyncio" and not (watcher and watcher.ready):
+            try:
+                await self.docker("wait", self.container_id, timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+            except docker.errors.NotFound:
+                pass
+            return True
+
+        delay = 0.1
+        while True:
+            entry = watcher.lookup(self.container_id) if watcher else None
+            if entry is not None:
+                if not entry["State"].get("Running"):
+                    return True
+            else:
+                try:
+                    container = await self.docker(
+                        "inspect_container", self.container_id
+                    )
+                except docker.errors.NotFound:
+                    return True
+                if not container["State"]["Running"]:
+                    return True
+                # back off, since each check is a docker call
+                delay = min(delay * 2, 1)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if entry is not None:
+                await watcher.wait_for_change(remaining)
+            else:
+                await asyncio.sleep(min(delay, remaining))
+
+    async def pause_object(self):
+        """Pause the container
+
+        e.g. calling ``docker pause``.
+        Returns whether the container was paused by this call.
+        """
+        try:
+            await self.docker("pause", self.container_id)
+        except APIError as e:
+            if e.status_code == 404:
+                self.log.debug(
+                    "Already removed %s: %s", self.object_type, self.object_id
+                )
+                self.object_id = ""
+                return False
+            elif e.status_code == 409:
+                # already paused, or not running
+                self.log.debug(
+                    "Not pausing %s %s: %s", self.object_type, self.object_id, e
+                )
+                return False
+            else:
+                raise
+        return True
+
+    async def unpause_object(self):
+        """Unpause the container
+
+        e.g. calling ``docker unpause``
+        """
+        await self.docker("unpause", self.container_id)
+        self.paused_at = None
+        self._paused_api_token = ""
+
+    def _schedule_pause_timeout(self):
+        """Stop the paused container after pause_timeout"""
+        if not self.pause_timeout:
+            return
+        if self._pause_timer is not None and not self._pause_timer.done():
+            return
+        if self.paused_at is None:
+            # we don't know when it was paused
+            self.paused_at = time.time()
+        delay = max(0, self.paused_at + self.pause_timeout - time.time())
+        self._pause_timer = asyncio.ensure_future(self._stop_paused(delay))
+
+    def _rearm_pause_timeout(self):
+        """Schedule the pause timeout of a container paused before the Hub started
+
+        Also sweeps for other paused containers,
+        since JupyterHub doesn't load stopped servers when it starts.
+        """
+        if self.stop_mode != "pause" or self.object_type != "container":
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._schedule_pause_timeout()
+        key = json.dumps(
+            [self.docker_base_url, self.batch_poll_filters], sort_keys=True
+        )
+        if self.pause_timeout and key not in self._paused_sweeps:
+            self._paused_sweeps[key] = asyncio.ensure_future(self._sweep_paused())
 
-    async def pull_image(self, image):
+    async def _sweep_paused(self):
+        """Schedule the pause timeouts of all paused containers
+
+        Their servers are stopped, so JupyterHub doesn't load them,
+        and we don't know when they were paused.
+        Servers that are loaded later use the time they were paused instead.
+        """
+        try:
+            containers = await self.docker(
+                "containers", filters=dict(self.batch_poll_filters, status="paused")
+            )
+        except Exception:
+            self.log.exception("Error listing paused containers")
+            return
+        for container in containers:
+            if container["Id"] == self.object_id:
+                continue
+            spawner = self.__class__(config=self.config, log=self.log)
+            spawner.object_name = (container.get("Names") or ["/"])[0].lstrip("/")
+            spawner.object_id = container["Id"]
+            self.log.info(
+                "Stopping paused container %s in %is",
+                spawner.object_name,
+                self.pause_timeout,
+            )
+            spawner._schedule_pause_timeout()
+
+    def _cancel_pause_timeout(self):
+        if self._pause_timer is not None:
+            self._pause_timer.cancel()
+            self._pause_timer = None
+
+    async def _stop_paused(self, delay):
+        await asyncio.sleep(delay)
+        try:
+            obj = await self.get_object()
+            if not obj or not obj["State"].get("Paused"):
+                return
+            self.log.info(
+                "Stopping %s %s (id: %s), paused for %is",
+                self.object_type,
+                self.object_name,
+                self.object_id[:7],
+                time.time() - self.paused_at,
+            )
+            await self.unpause_object()
+            await self.stop_object()
+            if self.remove:
+                await self.remove_object()
+                self.object_id = ""
+        except Exception:
+            self.log.exception(
+                "Error stopping paused %s %s", self.object_type, self.object_name
+            )
+
+    async def pull_image(self, image, report_progress=True):
         """Pull the image, if needed
 
         - pulls it unconditionally if pull_policy == 'always'
@@ -1224,30 +2570,24 @@ class DockerSpawner(Spawner):
         - otherwise, checks if it exists, and
           - raises if pull_policy == 'never'
           - pulls if pull_policy == 'ifnotpresent'
+
+        With ``report_progress=False``, e.g. for helper images,
+        the pull is not reported by ``progress``.
         """
         if self.pull_policy == "skip":
             self.log.debug(f"Skipping pull of {image}")
             return
-        # docker wants to split repo:tag
-        # the part split("/")[-1] allows having an image from a custom repo
-        # with port but without tag. For example: my.docker.repo:51150/foo would not
-        # pass this test, resulting in image=my.docker.repo:51150/foo and tag=latest
-        if ':' in image.split("/")[-1]:
-            # rsplit splits from right to left, allowing to have a custom image repo with port
-            repo, tag = image.rsplit(':', 1)
-        else:
-            repo = image
-            tag = 'latest'
+        repo, tag = _split_image(image)
 
         if self.pull_policy.lower() == 'always':
             # always pull
             self.log.info("pulling %s", image)
-            await self.docker('pull', repo, tag)
+            await self._pull(repo, tag, report_progress=report_progress)
             # done
             return
         try:
             # check if the image is present
-            await self.docker('inspect_image', image)
+            await self.inspect_image(image)
         except docker.errors.NotFound:
             if self.pull_policy == "never":
                 # never pull, raise because there is no such image
@@ -1255,7 +2595,329 @@ class DockerSpawner(Spawner):
             elif self.pull_policy == "ifnotpresent":
                 # not present, pull it for the first time
                 self.log.info("pulling image %s", image)
-                await self.docker('pull', repo, tag)
+                await self._pull(repo, tag, report_progress=report_progress)
+
+    pull_concurrency = Int(
+        0,
+        config=True,
+        help="""Maximum number of different images pulled at the same time on a docker daemon.
+
+        Further pulls wait for one of the pulls in progress to finish.
+        Concurrent pulls of the *same* image are always shared,
+        regardless of this limit.
+        0 means no limit.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # pulls in progress, by (docker url, repo, tag)
+    _image_pulls = {}
+    # PullProgress of pulls in progress, by the same key
+    _pull_progress = {}
+    # stats of the last pull of each image, e.g. for metrics
+    pull_stats = {}
+    # the pull this spawner is waiting for, reported by progress()
+    _spawn_pull = None
+    # keys of pulls in progress started by the pre-puller
+    _prepulls = set()
+    # pull concurrency limits, by docker url
+    _pull_slots = {}
+
+    async def _pull(self, repo, tag, prepull=False, report_progress=True):
+        """Pull an image
+
+        If the same image is already being pulled, wait for that pull instead.
+        """
+        key = (self.docker_base_url, repo, tag)
+        pulls = self._image_pulls
+        f = pulls.get(key)
+        if f is not None and f.get_loop() is asyncio.get_running_loop():
+            self.log.info(
+                "Waiting for pull of %s:%s already in progress for %s",
+                repo,
+                tag,
+                self._log_name,
+            )
+            progress = self._pull_progress[key]
+        else:
+            progress = self._pull_progress[key] = PullProgress(f"{repo}:{tag}")
+            f = pulls[key] = asyncio.ensure_future(
+                self._limited_pull(repo, tag, progress, low_priority=prepull)
+            )
+            if prepull:
+                self._prepulls.add(key)
+
+            def _done(f):
+                if pulls.get(key) is f:
+                    del pulls[key]
+                    del self._pull_progress[key]
+                    self._prepulls.discard(key)
+
+            f.add_done_callback(_done)
+        if report_progress and not prepull:
+            self._spawn_pull = progress
+        # shield, so one cancelled spawn doesn't cancel the pull for everyone
+        return await asyncio.shield(f)
+
+    async def _limited_pull(self, repo, tag, progress, low_priority=False):
+        """Pull an image, within the limit of pull_concurrency"""
+        if not self.pull_concurrency:
+            return await self._pull_now(repo, tag, progress)
+        docker_url = self.docker_base_url
+        slots = self._pull_slots.get(docker_url)
+        if slots is None:
+            # keep a slot for spawns, if pre-pulls can leave one
+            slots = self._pull_slots[docker_url] = _Slots(
+                self.pull_concurrency,
+                reserved=1 if self.pull_concurrency > 1 else 0,
+            )
+        if slots.active >= slots.limit:
+            self.log.info(
+                "Waiting for one of %i pulls in progress to pull %s:%s",
+                slots.active,
+                repo,
+                tag,
+            )
+        await slots.acquire(low_priority=low_priority)
+        try:
+            return await self._pull_now(repo, tag, progress)
+        finally:
+            slots.release()
+
+    prepull_interval = Float(
+        0,
+        config=True,
+        help="""Pull ``image`` and the images in ``allowed_images`` every this many seconds.
+
+        Pre-pulling runs in the background on the Hub,
+        so that users don't wait for a pull the first time they pick an image
+        (e.g. one just added to ``allowed_images``),
+        and images stay up to date.
+        ``prepull_concurrency`` images are pulled at a time,
+        and a pre-pull only starts while no spawn is waiting for a pull.
+        With ``pull_concurrency`` > 1, one of its slots is kept for spawns;
+        with ``pull_concurrency = 1``, a spawn that needs a pull
+        while an image is being pre-pulled waits for the pre-pull to finish.
+
+        Images in a callable or ``'*'`` ``allowed_images`` can't be pre-pulled.
+        Pre-pulling is skipped with ``pull_policy = 'skip'``.
+        It starts with the first spawn after the Hub starts.
+
+        0 (default) disables pre-pulling.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    prepull_mode = CaselessStrEnum(
+        ["all", "popular"],
+        default_value="all",
+        config=True,
+        help="""Which images to pre-pull, see ``prepull_interval``.
+
+        - all: all images, the ones users pick most often first
+        - popular: only the ``prepull_popular_count`` images
+          users pick most often, and ``image``
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    prepull_popular_count = Int(
+        3,
+        config=True,
+        help="""Number of images to pre-pull with ``prepull_mode = 'popular'``.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    prepull_concurrency = Int(
+        1,
+        config=True,
+        help="""Number of images pre-pulled at the same time, see ``prepull_interval``.
+
+        Pre-pulls are also subject to ``pull_concurrency``.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # how many times each image has been started
+    image_popularity = Counter()
+
+    # pre-pullers, by spawner class and configuration
+    _prepullers = {}
+
+    @property
+    def prepuller(self):
+        """The background image pre-puller for this spawner's configuration
+
+        Its ``status`` attribute has the state of each pre-pulled image.
+        """
+        cls = self.__class__
+        settings = dict(
+            interval=self.prepull_interval,
+            mode=self.prepull_mode,
+            popular_count=self.prepull_popular_count,
+            concurrency=self.prepull_concurrency,
+        )
+        key = (cls, repr(sorted(settings.items())), repr(self.config))
+        if key not in self._prepullers:
+            self._prepullers[key] = ImagePrePuller(
+                spawner_class=cls, config=self.config, log=self.log, **settings
+            )
+        return self._prepullers[key]
+
+    @property
+    def _prepull_enabled(self):
+        return bool(self.prepull_interval) and self.pull_policy != "skip"
+
+    def _start_prepuller(self):
+        """Start the pre-puller, if enabled and there is an event loop"""
+        if not self._prepull_enabled:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.prepuller.start()
+
+    def _spawn_pulls_in_progress(self):
+        """Whether there are pulls in progress not started by the pre-puller"""
+        docker_url = self.docker_base_url
+        return any(
+            key[0] == docker_url and key not in self._prepulls
+            for key in self._image_pulls
+        )
+
+    async def prepull_image(self, image):
+        """Pull an image ahead of time
+
+        Waits while pulls needed by spawns are in progress before starting,
+        but doesn't give way to spawns once started.
+        """
+        repo, tag = _split_image(image)
+        while self._spawn_pulls_in_progress():
+            await asyncio.sleep(1)
+        self.log.info("Pre-pulling %s", image)
+        await self._pull(repo, tag, prepull=True)
+
+    def _iter_stream(self, stream, lane):
+        """Iterate over a streamed docker response from either backend
+
+        With the threaded backend, the stream is consumed in ``lane``,
+        so it counts against the lane's threads until it ends.
+        """
+        if hasattr(stream, "__aiter__"):
+            return stream
+        return iter_stream_in_thread(stream, run=self.lanes[lane].submit)
+
+    async def _pull_now(self, repo, tag, progress):
+        """Actually pull an image, recording its progress"""
+        progress.start()
+        try:
+            stream = await self.docker('pull', repo, tag, stream=True, decode=True)
+            async for msg in self._iter_stream(stream, "pull"):
+                if "error" in msg:
+                    # errors during a pull don't set the response status
+                    raise APIError(msg["error"])
+                progress.update(msg)
+        except Exception as e:
+            progress.finish(error=e)
+            raise
+        else:
+            progress.finish()
+            self.log.info(progress.message)
+        finally:
+            self.pull_stats[progress.image] = progress.stats()
+            IMAGE_PULL_DURATION_SECONDS.labels(status=progress.status).observe(
+                progress.duration
+            )
+            cache = self.image_cache
+            if cache is not None:
+                cache.invalidate(f"{repo}:{tag}")
+                if tag == "latest":
+                    cache.invalidate(repo)
+
+    # the phases of the start in progress
+    _start_phases = None
+    # durations of the phases of the last start, e.g. for metrics
+    start_phase_durations = {}
+
+    _phase_messages = {
+        "image": "Checked image",
+        "pull": "Pulled image",
+        "object": "Looked up existing server",
+        "options": "Prepared container options",
+        "command": "Got command",
+        "certs": "Staged internal ssl certs",
+        "create": "Created server",
+        "start": "Started server",
+        "post_start": "Ran post_start_cmd",
+        "address": "Got server address",
+    }
+
+    def _start_progress(self):
+        """Overall progress of the start in progress, in percent"""
+        graph = self._start_phases
+        if graph is None:
+            return 0
+        fraction = graph.progress
+        pull = self._spawn_pull
+        if (
+            pull is not None
+            and "pull" in graph.phases
+            and "pull" not in graph.durations
+        ):
+            total = sum(phase["weight"] for phase in graph.phases.values())
+            fraction += graph.phases["pull"]["weight"] * pull.percent / 100 / total
+        # leave the rest for the server to come up
+        return int(90 * fraction)
+
+    def _phase_done(self, name, duration):
+        SPAWN_PHASE_DURATION_SECONDS.labels(phase=name).observe(duration)
+        message = self._phase_messages.get(name, name)
+        self._start_events.append(
+            {
+                "progress": self._start_progress(),
+                "message": f"{message} ({duration:.2f}s)",
+            }
+        )
+        self._start_events_changed.set()
+
+    async def progress(self):
+        """Report the phases of starting, and the progress of pulling the image"""
+        sent = 0
+        last_message = None
+        while self._spawn_pending:
+            events = self._start_events
+            for event in events[sent:]:
+                yield event
+            sent = len(events)
+            pull = self._spawn_pull
+            if (
+                pull is not None
+                and pull.status == "pulling"
+                and pull.message != last_message
+            ):
+                last_message = pull.message
+                yield {"progress": self._start_progress(), "message": last_message}
+            changed = self._start_events_changed
+            if changed is None:
+                await asyncio.sleep(1)
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+
+    _start_events = ()
+    _start_events_changed = None
+    # values computed once per start, shared by its phases
+    _start_memo = None
 
     async def start(self):
         """Start the single-user server in a docker container.
@@ -1263,7 +2925,77 @@ class DockerSpawner(Spawner):
         If the container exists and ``c.DockerSpawner.remove`` is ``True``, then
         the container is removed first. Otherwise, the existing containers
         will be restarted.
+
+        Starting is done in phases (see ``_add_start_phases``),
+        which run concurrently where they don't depend on each other.
+        Each finished phase is reported as a progress event.
+        """
+        self._cancel_pause_timeout()
+        self._spawn_pull = None
+        self.docker_calls = Counter()
+        self._start_memo = {}
+        self._start_events = []
+        self._start_events_changed = asyncio.Event()
+        graph = self._start_phases = PhaseGraph(on_phase_done=self._phase_done)
+        self._add_start_phases(graph)
+        try:
+            results = await graph.run()
+        finally:
+            self._start_memo = None
+            self.start_phase_durations = graph.durations
+            self.log.info(
+                "Start of %s took %.2fs: %s",
+                self._log_name,
+                graph.duration,
+                ", ".join(
+                    f"{name} {duration:.2f}s"
+                    for name, duration in graph.durations.items()
+                ),
+            )
+            self.log.debug(
+                "Start of %s made %i docker calls: %s",
+                self._log_name,
+                sum(self.docker_calls.values()),
+                ", ".join(
+                    f"{method} {count}" for method, count in self.docker_calls.items()
+                ),
+            )
+        return results["address"]
+
+    def _add_start_phases(self, graph):
+        """Add the phases of start to a PhaseGraph
+
+        The result of the 'address' phase is returned by start.
         """
+        graph.add("image", self._resolve_image)
+        graph.add("pull", self._pull_start_image, after=["image"], weight=5)
+        # the object name may depend on the image
+        graph.add("object", self._find_object, after=["image"])
+        graph.add("options", self._get_extra_options, after=["image"])
+        # inspects the image, so must wait for the pull
+        graph.add("command", self._get_start_command, after=["pull"])
+        create_after = ["object", "command", "options"]
+        start_after = ["create"]
+        if self._certs_staging is not None:
+            graph.add(
+                "certs",
+                self._run_certs_staging,
+                after=["object"] if self._certs_after_object else [],
+            )
+            if self._certs_before_create:
+                create_after.append("certs")
+            else:
+                start_after.append("certs")
+        graph.add("create", self._create_start_object, after=create_after)
+        if self._certs_pending is not None:
+            graph.add("certs", self._put_certs_in_container, after=["create"])
+            start_after.append("certs")
+        graph.add("start", self._start_or_resume_object, after=start_after)
+        if self.post_start_cmd:
+            graph.add("post_start", self.post_start_exec, after=["start"])
+        graph.add("address", self.get_ip_and_port, after=["start"])
+
+    async def _resolve_image(self):
         # image priority:
         # 1. user options (from spawn options form)
         # 2. self.image from config
@@ -1271,12 +3003,27 @@ class DockerSpawner(Spawner):
         if image_option:
             # save choice in self.image
             self.image = await self.check_allowed(image_option)
-
-        image = self.image
-        await self.pull_image(image)
-
+        self.image_popularity[self.image] += 1
+        self._start_prepuller()
+
+    async def _pull_start_image(self):
+        await self.pull_image(self.image)
+
+    async def _get_start_command(self):
+        """get_command, computed once per start"""
+        memo = self._start_memo
+        if memo is None:
+            return await self.get_command()
+        if "command" not in memo:
+            memo["command"] = await self.get_command()
+        return memo["command"]
+
+    async def _find_object(self):
+        """Find an existing object, removing it if it should have been cleaned up"""
         obj = await self.get_object()
-        if obj and self.remove:
+        # resume a paused container, even with remove = True
+        paused = bool(obj) and obj.get("State", {}).get("Paused", False)
+        if obj and self.remove and not paused:
             self.log.warning(
                 "Removing %s that should have been cleaned up: %s (id: %s)",
                 self.object_type,
@@ -1286,8 +3033,25 @@ class DockerSpawner(Spawner):
             await self.remove_object()
 
             obj = None
+        self._start_memo["object"] = obj
+        self._start_memo["paused"] = paused
+
+    async def _create_start_object(self):
+        obj = self._start_memo["object"]
+        claimed = False
+        if obj is None and self._use_warm_pool():
+            claimed = await self.claim_warm_container()
+        self._start_memo["claimed"] = claimed
 
-        if obj is None:
+        if claimed:
+            self.log.info(
+                "Claimed %s %s (id: %s) from warm pool",
+                self.object_type,
+                self.object_name,
+                self.object_id[:7],
+            )
+
+        elif obj is None:
             obj = await self.create_object()
             self.object_id = obj[self.object_id_key]
             self.log.info(
@@ -1305,30 +3069,43 @@ class DockerSpawner(Spawner):
                 self.object_name,
                 self.object_id[:7],
             )
-            # Handle re-using API token.
-            # Get the API token from the environment variables
-            # of the running container:
-            for line in obj["Config"]["Env"]:
-                if line.startswith(("JPY_API_TOKEN=", "JUPYTERHUB_API_TOKEN=")):
-                    self.api_token = line.split("=", 1)[1]
-                    break
-
-        # TODO: handle unpause
-        self.log.info(
-            "Starting %s %s (id: %s)",
-            self.object_type,
-            self.object_name,
-            self.container_id[:7],
-        )
-
-        # start the container
-        await self.start_object()
+            if self._start_memo["paused"] and self._paused_api_token:
+                # the paused container keeps using its API token
+                self.api_token = self._paused_api_token
+            else:
+                # Handle re-using API token.
+                # Get the API token from the environment variables
+                # of the running container
+                # (or one paused before the Hub restarted):
+                for line in self._object_env(obj):
+                    if line.startswith(("JPY_API_TOKEN=", "JUPYTERHUB_API_TOKEN=")):
+                        self.api_token = line.split("=", 1)[1]
+                        break
+
+    def _object_env(self, obj):
+        """The environment of an existing object, as a list of 'KEY=value'"""
+        return obj["Config"]["Env"]
+
+    async def _start_or_resume_object(self):
+        if self._start_memo["paused"]:
+            self.log.info(
+                "Unpausing %s %s (id: %s)",
+                self.object_type,
+                self.object_name,
+                self.container_id[:7],
+            )
+            await self.unpause_object()
 
-        if self.post_start_cmd:
-            await self.post_start_exec()
+        elif not self._start_memo["claimed"]:
+            self.log.info(
+                "Starting %s %s (id: %s)",
+                self.object_type,
+                self.object_name,
+                self.container_id[:7],
+            )
 
-        ip, port = await self.get_ip_and_port()
-        return (ip, port)
+            # start the container
+            await self.start_object()
 
     @property
     def internal_hostname(self):
@@ -1360,7 +3137,7 @@ class DockerSpawner(Spawner):
             ip = self.internal_hostname
             port = self.port
         elif self.use_internal_ip:
-            resp = await self.docker("inspect_container", self.container_id)
+            resp = await self._inspect_started_object()
             network_settings = resp["NetworkSettings"]
             if "Networks" in network_settings:
                 ip = self.get_network_ip(network_settings)
@@ -1368,7 +3145,8 @@ class DockerSpawner(Spawner):
                 ip = network_settings["IPAddress"]
             port = self.port
         else:
-            resp = await self.docker("port", self.container_id, self.port)
+            # the same as docker("port"), which inspects the container
+            resp = _host_ports(await self._inspect_started_object(), self.port)
             if resp is None:
                 raise RuntimeError("Failed to get port info for %s" % self.container_id)
 
@@ -1376,12 +3154,28 @@ class DockerSpawner(Spawner):
             port = int(resp[0]["HostPort"])
 
         if ip == "0.0.0.0":
-            ip = urlparse(self.client.base_url).hostname
+            ip = urlparse(self.docker_base_url).hostname
             if ip == "localnpipe":
                 ip = "localhost"
 
         return ip, port
 
+    async def _inspect_started_object(self):
+        """Inspect the object once it has started
+
+        Only inspected once per start.
+        """
+        memo = self._start_memo
+        if memo is not None and "started" in memo:
+            return memo["started"]
+        obj = await self.docker("inspect_%s" % self.object_type, self.object_id)
+        watcher = self.event_watcher
+        if watcher and self.object_type == "container":
+            watcher.remember(obj)
+        if memo is not None:
+            memo["started"] = obj
+        return obj
+
     def get_network_ip(self, network_settings):
         networks = network_settings["Networks"]
         if self.network_name not in networks:
@@ -1396,13 +3190,119 @@ class DockerSpawner(Spawner):
         ip = network["IPAddress"]
         return ip
 
+    stop_concurrency = Int(
+        16,
+        config=True,
+        help="""Maximum number of servers stopped at the same time on a docker daemon.
+
+        Further stops wait for one of the stops in progress to finish.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    stop_batch_window = Float(
+        0.1,
+        config=True,
+        help="""Stops arriving within this many seconds of each other are run as a batch.
+
+        e.g. at Hub shutdown, or when many idle servers are culled at once.
+        Batches are stopped in parallel (see ``stop_concurrency``),
+        and reported on together.
+        A stop arriving when no other stops are waiting or in progress
+        is run right away.
+
+        0 disables batching.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # stop concurrency limits, by docker url
+    _stop_slots = {}
+    _stop_batcher = None
+
+    @classmethod
+    async def stop_all(cls, spawners, now=False):
+        """Stop many servers at once
+
+        Stops run in parallel, up to ``stop_concurrency`` per docker daemon,
+        and each spawner's state is cleared as with ``stop``.
+
+        Returns a dict of the exceptions raised, by spawner.
+        They are not logged here: ``stop`` raises them for JupyterHub to log.
+        """
+        if not spawners:
+            return {}
+        log = spawners[0].log
+        start = time.monotonic()
+
+        async def stop_one(spawner):
+            docker_url = spawner.docker_base_url
+            slots = cls._stop_slots.get(docker_url)
+            if slots is None:
+                slots = cls._stop_slots[docker_url] = _Slots(spawner.stop_concurrency)
+            await slots.acquire()
+            try:
+                await spawner._stop(now=now)
+            finally:
+                slots.release()
+
+        results = await asyncio.gather(
+            *(stop_one(spawner) for spawner in spawners), return_exceptions=True
+        )
+        errors = {
+            spawner: result
+            for spawner, result in zip(spawners, results)
+            if isinstance(result, BaseException)
+        }
+        if len(spawners) > 1:
+            log.info(
+                "Stopped %i servers in %.1fs, %i failed",
+                len(spawners) - len(errors),
+                time.monotonic() - start,
+                len(errors),
+            )
+        return errors
+
     async def stop(self, now=False):
         """Stop the container
 
         Will remove the container if ``c.DockerSpawner.remove`` is ``True``.
 
-        Consider using pause/unpause when docker-py adds support.
+        With ``c.DockerSpawner.stop_mode = 'pause'``, pauses it instead.
+
+        Stops arriving together are run as a batch with ``stop_all``.
         """
+        if self.stop_batch_window:
+            cls = self.__class__
+            if cls._stop_batcher is None:
+                cls._stop_batcher = StopBatcher(cls.stop_all, self.stop_batch_window)
+            await cls._stop_batcher.submit(self, now=now)
+            return
+        errors = await self.stop_all([self], now=now)
+        if errors:
+            raise errors[self]
+
+    async def _stop(self, now=False):
+        """Stop this server, see ``stop``"""
+        if self.stop_mode == "pause" and self.object_type == "container":
+            self.log.info(
+                "Pausing %s %s (id: %s)",
+                self.object_type,
+                self.object_name,
+                self.object_id[:7],
+            )
+            if await self.pause_object() or self.paused_at is None:
+                self.paused_at = time.time()
+            if self.object_id:
+                self._schedule_pause_timeout()
+                # keep the token, which the paused container still uses
+                self._paused_api_token = self.api_token
+            else:
+                self.paused_at = None
+            return
+
         self.log.info(
             "Stopping %s %s (id: %s)",
             self.object_type,
@@ -1411,7 +3311,7 @@ class DockerSpawner(Spawner):
         )
         await self.stop_object()
 
-        if self.remove:
+        if self.remove and self.object_id:
             await self.remove_object()
             # clear object_id to avoid persisting removed state
             self.object_id = ""
@@ -0,0 +1,420 @@
+"""
+Track the state of docker objects from the docker events stream
+
+so that spawners can answer poll and get_object without API calls.
+"""
+
+import asyncio
+import copy
+import re
+import threading
+from datetime import datetime, timezone
+
+# container actions, and the State fields they set
+_container_state_updates = {
+    "create": {"Status": "created", "Running": False, "Paused": False},
+    "start": {"Status": "running", "Running": True, "Paused": False},
+    "restart": {"Status": "running", "Running": True, "Paused": False},
+    "unpause": {"Status": "running", "Running": True, "Paused": False},
+    "pause": {"Status": "paused", "Running": True, "Paused": True},
+    "die": {"Status": "exited", "Running": False, "Paused": False},
+}
+
+# container listing State string to inspect State fields
+_listing_states = {
+    "created": {"Running": False, "Paused": False},
+    "running": {"Running": True, "Paused": False},
+    "restarting": {"Running": True, "Paused": False, "Restarting": True},
+    "paused": {"Running": True, "Paused": True},
+    "exited": {"Running": False, "Paused": False},
+    "dead": {"Running": False, "Paused": False, "Dead": True},
+}
+
+# swarm labels on containers that are service tasks
+_service_name_label = "com.docker.swarm.service.name"
+_service_id_label = "com.docker.swarm.service.id"
+_task_id_label = "com.docker.swarm.task.id"
+_node_id_label = "com.docker.swarm.node.id"
+
+
+def _event_time(event):
+    """RFC 3339 timestamp of an event, as used in inspect output"""
+    if "timeNano" in event:
+        ts = event["timeNano"] / 1e9
+    else:
+        ts = event.get("time", 0)
+    return (
+        datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+    )
+
+
+async def iter_stream_in_thread(stream, run=None):
+    """Iterate over one of docker-py's blocking streams on the event loop
+
+    e.g. events or pull progress.
+    By default, the stream is consumed in a dedicated thread,
+    since it may be held open indefinitely.
+    Streams that end (e.g. pulls) may instead be consumed by ``run``,
+    a coroutine function that calls a function in a thread pool,
+    such as :meth:`_DockerLane.submit`.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def consume():
+        try:
+            for event in stream:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    def consumed(f):
+        # consume couldn't run, e.g. the thread pool is full
+        if f.cancelled():
+            queue.put_nowait(asyncio.CancelledError())
+        elif f.exception() is not None:
+            queue.put_nowait(f.exception())
+
+    if run is None:
+        threading.Thread(
+            target=consume, name="dockerspawner-stream", daemon=True
+        ).start()
+    else:
+        asyncio.ensure_future(run(consume)).add_done_callback(consumed)
+    try:
+        while True:
+            event = await queue.get()
+            if event is done:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+class DockerEventWatcher:
+    """Maintain a table of container state from the docker events stream
+
+    The table maps container ids to their ``State``
+    (in the same format as ``docker inspect``),
+    and, once inspected, the full inspect output.
+    Containers that are run as swarm service tasks are indexed by service name.
+
+    After every (re)connection of the event stream,
+    the table is rebuilt from a full listing.
+    The table is only used while the stream is connected (:attr:`ready`).
+
+    Args:
+        events: coroutine function returning an async iterator of decoded events,
+            given event filters
+        list_containers: coroutine function returning a list of containers,
+            as from ``docker ps -a``
+        filters: filters for the event stream
+        name_pattern: only track containers whose names match this regex,
+            or any of a list of them (as in docker's ``name`` filter)
+        log: logger
+        on_image_event: optional callback for image events,
+            called with the action, image id and event attributes
+        list_filters: filters of ``list_containers``, if any
+    """
+
+    # how many removed service names to remember
+    max_removed_services = 1024
+
+    def __init__(
+        self,
+        events,
+        list_containers,
+        filters,
+        name_pattern,
+        log,
+        on_image_event=None,
+        list_filters=None,
+    ):
+        self.events = events
+        self.on_image_event = on_image_event
+        self.list_containers = list_containers
+        self.filters = filters
+        self.list_filters = list_filters or {}
+        if isinstance(name_pattern, (list, tuple)):
+            name_pattern = "|".join(f"(?:{pattern})" for pattern in name_pattern)
+        self.name_pattern = re.compile(name_pattern) if name_pattern else None
+        self.log = log
+        self.ready = False
+        self.containers = {}
+        self.names = {}
+        # recently removed services, oldest first
+        self.removed_services = {}
+        self.task = None
+        self._waiters = []
+
+    def start(self):
+        """Start watching, if not already running"""
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.ready = False
+            self.task = asyncio.ensure_future(self._watch())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.ready = False
+
+    async def _watch(self):
+        delay = 1
+        while True:
+            try:
+                stream = await self.events(filters=self.filters)
+                # resync after connecting, so we miss nothing in between
+                await self._resync()
+                self.ready = True
+                delay = 1
+                async for event in stream:
+                    self.handle_event(event)
+                self.log.warning("Docker event stream closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.error(
+                    "Error watching docker events, retrying in %is: %s", delay, e
+                )
+            self.ready = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _resync(self):
+        containers = await self.list_containers()
+        old = self.containers
+        self.containers = {}
+        self.names = {}
+        for container in containers:
+            name = (container.get("Names") or ["/"])[0].lstrip("/")
+            if not self._tracked(name):
+                continue
+            state = {"Status": container.get("State", "")}
+            state.update(_listing_states.get(state["Status"], {}))
+            entry = old.get(container["Id"])
+            if entry and entry["State"].get("Status") == state["Status"]:
+                # keep what we know, e.g. exit codes
+                state = entry["State"]
+                obj = entry["object"]
+            else:
+                obj = None
+            self._add(container["Id"], name, container.get("Labels") or {}, state, obj)
+        self.log.debug("Synced %i containers from docker", len(self.containers))
+
+    def _tracked(self, name):
+        return self.name_pattern is None or self.name_pattern.search(name)
+
+    def _add(self, container_id, name, labels, state, obj=None):
+        entry = {
+            "Id": container_id,
+            "Name": name,
+            "Labels": labels,
+            "State": state,
+            "object": obj,
+        }
+        self.containers[container_id] = entry
+        self.names[name] = container_id
+        return entry
+
+    async def wait_for_change(self, timeout, service_name=None):
+        """Wait for the next event, up to timeout seconds
+
+        With service_name, only events about that swarm service
+        (or its containers) count.
+
+        Returns whether there was an event.
+        """
+        waiter = (service_name, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return True
+
+    def _wake(self, service_name):
+        for waiter in list(self._waiters):
+            waiter_service, f = waiter
+            if waiter_service is None or waiter_service == service_name:
+                self._waiters.remove(waiter)
+                if not f.done():
+                    f.set_result(None)
+
+    def handle_event(self, event):
+        """Update the table from one event"""
+        event_type = event.get("Type")
+        action = event.get("Action", "")
+        actor = event.get("Actor") or {}
+        attributes = actor.get("Attributes") or {}
+        try:
+            self._handle_event(event_type, action, actor, attributes, event)
+        finally:
+            if event_type == "service":
+                self._wake(attributes.get("name"))
+            else:
+                self._wake(attributes.get(_service_name_label))
+
+    def _handle_event(self, event_type, action, actor, attributes, event):
+        if event_type == "service":
+            name = attributes.get("name")
+            if action == "remove":
+                self.removed_services.pop(name, None)
+                self.removed_services[name] = True
+                while len(self.removed_services) > self.max_removed_services:
+                    self.removed_services.pop(next(iter(self.removed_services)))
+            elif action == "create":
+                self.removed_services.pop(name, None)
+        elif event_type == "container":
+            self._handle_container_event(action, actor.get("ID"), attributes, event)
+        elif event_type == "image" and self.on_image_event:
+            self.on_image_event(action, actor.get("ID"), attributes)
+
+    def _handle_container_event(self, action, container_id, attributes, event):
+        name = attributes.get("name", "")
+        entry = self.containers.get(container_id)
+        if entry is None:
+            if not self._tracked(name):
+                return
+            entry = self._add(
+                container_id,
+                name,
+                {
+                    key: value
+                    for key, value in attributes.items()
+                    if key not in {"name", "image", "exitCode"}
+                },
+                {"Status": "created", "Running": False, "Paused": False},
+            )
+        state = entry["State"]
+        if action in _container_state_updates:
+            state.update(_container_state_updates[action])
+        if action == "start":
+            state["StartedAt"] = _event_time(event)
+            # network settings change on start
+            entry["object"] = None
+        elif action == "die":
+            state["ExitCode"] = int(attributes.get("exitCode", -1))
+            state["FinishedAt"] = _event_time(event)
+            state.setdefault("Error", "")
+        elif action == "destroy":
+            # forget it, so the table doesn't grow without bound
+            del self.containers[container_id]
+            if self.names.get(entry["Name"]) == container_id:
+                del self.names[entry["Name"]]
+        elif action == "rename":
+            self.names.pop(attributes.get("oldName", "").lstrip("/"), None)
+            entry["Name"] = name
+            self.names[name] = container_id
+            entry["object"] = None
+        elif action.startswith("health_status:"):
+            state.setdefault("Health", {})["Status"] = action.split(":", 1)[1].strip()
+
+    def lookup(self, key):
+        """Find a container entry by id or name
+
+        Returns None if we don't know anything about it.
+        """
+        if not self.ready or not key:
+            return None
+        entry = self.containers.get(key)
+        if entry is None and key in self.names:
+            entry = self.containers.get(self.names[key])
+        return entry
+
+    def knows_all(self, name):
+        """Whether all containers with this name would be in the table
+
+        i.e. a container missing from the table doesn't exist.
+        Not if containers may be left out by filters other than the name,
+        e.g. labels, which we can't check for a container we don't know.
+        """
+        return (
+            self.ready
+            and bool(self._tracked(name))
+            and set(self.filters) <= {"type"}
+            and set(self.list_filters) <= {"name"}
+        )
+
+    def get_object(self, key):
+        """Return a copy of the inspect output for a container, with current state
+
+        Returns None if the container has not been inspected since it last changed.
+        """
+        entry = self.lookup(key)
+        if entry is None or entry["object"] is None:
+            return None
+        return copy.deepcopy(entry["object"])
+
+    def remember(self, obj):
+        """Store the inspect output for a container"""
+        name = obj.get("Name", "").lstrip("/")
+        entry = self.containers.get(obj["Id"])
+        if entry is None:
+            if not self._tracked(name):
+                return
+            entry = self._add(
+                obj["Id"], name, obj.get("Config", {}).get("Labels") or {}, {}
+            )
+        # keep the State dict shared, so events update it in place
+        entry["State"].update(obj["State"])
+        obj = dict(obj)
+        obj["State"] = entry["State"]
+        entry["object"] = obj
+
+    def get_service_container(self, service_name):
+        """Return the most recent container entry for a swarm service
+
+        Only containers on this node can be seen.
+        """
+        if not self.ready:
+            return None
+        found = None
+        for entry in self.containers.values():
+            if entry["Labels"].get(_service_name_label) != service_name:
+                continue
+            if found is None or entry["State"].get("StartedAt", "") > found[
+                "State"
+            ].get("StartedAt", ""):
+                found = entry
+        return found
+
+
+def task_from_container(entry):
+    """Describe a service task from the entry for its container
+
+    Returns a dict in the same shape as (a subset of) a task from ``docker service ps``.
+    """
+    labels = entry["Labels"]
+    state = entry["State"]
+    if state.get("Running"):
+        task_state = "running"
+    elif "ExitCode" in state:
+        task_state = "complete" if state["ExitCode"] == 0 else "failed"
+    else:
+        task_state = "starting"
+    return {
+        "ID": labels.get(_task_id_label, ""),
+        "ServiceID": labels.get(_service_id_label, ""),
+        "NodeID": labels.get(_node_id_label, ""),
+        "DesiredState": "running",
+        "Status": {
+            "State": task_state,
+            "Message": state.get("Status", ""),
+            "ContainerStatus": {
+                "ContainerID": entry["Id"],
+                "ExitCode": state.get("ExitCode", 0),
+            },
+        },
+    }
@@ -0,0 +1,75 @@
+"""
+Cache of image metadata
+
+so that starting from an image that is already present
+doesn't need to inspect it every time.
+"""
+
+import time
+from collections import OrderedDict
+
+
+def _summarize(image_info):
+    """The parts of docker inspect output for an image that we use"""
+    config = image_info.get("Config") or {}
+    return {
+        "Id": image_info["Id"],
+        "RepoTags": image_info.get("RepoTags") or [],
+        "RepoDigests": image_info.get("RepoDigests") or [],
+        "Config": {
+            "Cmd": config.get("Cmd"),
+            "Entrypoint": config.get("Entrypoint"),
+        },
+    }
+
+
+class ImageCache:
+    """A TTL and LRU cache of image metadata for one docker daemon
+
+    Entries are stored by the image reference they were looked up by,
+    and by image id (digest), so they can be invalidated by either.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, ref):
+        """Return cached info for an image reference or id, or None"""
+        entry = self._entries.get(ref)
+        if entry is None:
+            return None
+        expires, info = entry
+        if expires < time.monotonic():
+            del self._entries[ref]
+            return None
+        self._entries.move_to_end(ref)
+        return info
+
+    def put(self, ref, image_info):
+        """Store docker inspect output for an image reference"""
+        info = _summarize(image_info)
+        expires = time.monotonic() + self.ttl
+        for key in (ref, info["Id"]):
+            self._entries[key] = (expires, info)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return info
+
+    def invalidate(self, ref):
+        """Forget an image reference or id
+
+        Forgetting an id also forgets all references to it.
+        """
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return
+        image_id = entry[1]["Id"]
+        for key, (_, info) in list(self._entries.items()):
+            if info["Id"] == image_id:
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,74 @@
+"""
+Prometheus metrics exported by DockerSpawner
+
+Metrics are registered in the default prometheus_client registry,
+which JupyterHub serves at /hub/metrics.
+Names follow JupyterHub's `<noun>_<verb>_<type_suffix>` convention,
+with a ``dockerspawner_`` prefix.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+metrics_prefix = "dockerspawner"
+
+# the same as JupyterHub's server_spawn_duration_seconds
+spawn_duration_buckets = [
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    15,
+    30,
+    60,
+    120,
+    180,
+    300,
+    600,
+    float("inf"),
+]
+
+DOCKER_API_CALL_DURATION_SECONDS = Histogram(
+    "docker_api_call_duration_seconds",
+    "Duration of Docker API calls, including time queued",
+    ["method"],
+    namespace=metrics_prefix,
+)
+
+DOCKER_API_CALL_ERRORS = Counter(
+    "docker_api_call_errors",
+    "Docker API calls that failed, by response status code",
+    ["method", "status"],
+    namespace=metrics_prefix,
+)
+
+DOCKER_API_CALLS_RUNNING = Gauge(
+    "docker_api_calls_running",
+    "Docker API calls in flight",
+    ["lane"],
+    namespace=metrics_prefix,
+)
+
+DOCKER_API_CALLS_QUEUED = Gauge(
+    "docker_api_calls_queued",
+    "Docker API calls waiting for a thread of their executor lane",
+    ["lane"],
+    namespace=metrics_prefix,
+)
+
+IMAGE_PULL_DURATION_SECONDS = Histogram(
+    "image_pull_duration_seconds",
+    "Duration of image pulls",
+    ["status"],
+    buckets=spawn_duration_buckets,
+    namespace=metrics_prefix,
+)
+
+SPAWN_PHASE_DURATION_SECONDS = Histogram(
+    "spawn_phase_duration_seconds",
+    "Duration of the phases of starting servers"
+    " (e.g. pull, create, start, post_start, address)",
+    ["phase"],
+    buckets=spawn_duration_buckets,
+    namespace=metrics_prefix,
+)
@@ -0,0 +1,80 @@
+"""
+Phases of starting a server
+
+Starting a server is a series of steps (pull the image, look up an existing
+container, create it, ...), some of which don't depend on each other.
+Running them as a graph of phases lets independent phases run concurrently.
+"""
+
+import asyncio
+import time
+
+
+class PhaseGraph:
+    """Run coroutine functions in dependency order, concurrently where possible
+
+    Each phase starts as soon as the phases it runs ``after`` are done.
+    Phase return values are collected in :attr:`results`,
+    and durations in :attr:`durations`.
+    If a phase fails, the phases still running are cancelled
+    and the error is raised from :meth:`run`.
+
+    Args:
+        on_phase_done: optional callback,
+            called with the name and duration of each finished phase
+    """
+
+    def __init__(self, on_phase_done=None):
+        self.on_phase_done = on_phase_done
+        self.phases = {}
+        self.results = {}
+        self.durations = {}
+        self.duration = 0
+        self._tasks = {}
+
+    def add(self, name, func, after=(), weight=1):
+        """Add a phase
+
+        ``weight`` is its share of the expected total time, for :attr:`progress`.
+        """
+        for dependency in after:
+            if dependency not in self.phases:
+                raise ValueError(f"Phase {name} depends on unknown phase {dependency}")
+        self.phases[name] = {"func": func, "after": tuple(after), "weight": weight}
+
+    @property
+    def progress(self):
+        """Fraction of the weight of the phases that are done"""
+        total = sum(phase["weight"] for phase in self.phases.values())
+        if not total:
+            return 0
+        done = sum(self.phases[name]["weight"] for name in self.durations)
+        return done / total
+
+    async def _run_phase(self, name):
+        phase = self.phases[name]
+        for dependency in phase["after"]:
+            await self._tasks[dependency]
+        start = time.perf_counter()
+        result = self.results[name] = await phase["func"]()
+        duration = self.durations[name] = time.perf_counter() - start
+        if self.on_phase_done:
+            self.on_phase_done(name, duration)
+        return result
+
+    async def run(self):
+        """Run all phases, returns the results by phase name"""
+        start = time.perf_counter()
+        for name in self.phases:
+            self._tasks[name] = asyncio.ensure_future(self._run_phase(name))
+        try:
+            await asyncio.gather(*self._tasks.values())
+        except BaseException:
+            for task in self._tasks.values():
+                task.cancel()
+            # let cancelled phases clean up
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.duration = time.perf_counter() - start
+        return self.results
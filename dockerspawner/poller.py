@@ -0,0 +1,84 @@
+"""
+Shared polling of docker objects
+
+JupyterHub polls every running server.
+Instead of one inspect call per server,
+spawners can answer poll from a single listing shared by all of them.
+"""
+
+import asyncio
+import time
+
+
+class SnapshotPoller:
+    """Share one listing call among many callers
+
+    A new listing is made at most once every ``max_age`` seconds.
+    Callers arriving while a listing is in flight wait for that listing,
+    so there is never more than one in flight.
+
+    The listing is made by the ``fetch`` coroutine function passed to :meth:`get`,
+    which should return a dict of objects by key.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.snapshot = None
+        self.snapshot_time = 0
+        self._pending = None
+
+    async def _refresh(self, fetch):
+        try:
+            snapshot = await fetch()
+            self.snapshot = snapshot
+            self.snapshot_time = time.monotonic()
+            return snapshot
+        finally:
+            self._pending = None
+
+    async def get(self, fetch):
+        """Return the current snapshot, fetching a new one if it is too old"""
+        if (
+            self.snapshot is not None
+            and time.monotonic() - self.snapshot_time < self.max_age
+        ):
+            return self.snapshot
+        loop = asyncio.get_running_loop()
+        if self._pending is None or self._pending.get_loop() is not loop:
+            self._pending = asyncio.ensure_future(self._refresh(fetch))
+        # shield, so one cancelled caller doesn't cancel the listing for everyone
+        return await asyncio.shield(self._pending)
+
+    def invalidate(self):
+        """Discard the current snapshot"""
+        self.snapshot = None
+
+
+def index_containers(containers):
+    """Index a container listing by id and by name"""
+    index = {}
+    for container in containers:
+        index[container["Id"]] = container
+        for name in container.get("Names") or []:
+            index[name.lstrip("/")] = container
+    return index
+
+
+def index_tasks(tasks):
+    """Index a swarm task listing by service id
+
+    Each service gets its current task:
+    the most recent task that should be running,
+    or the most recent task if none should be running.
+    """
+    index = {}
+    for task in sorted(tasks, key=lambda task: task.get("CreatedAt", "")):
+        service_id = task.get("ServiceID")
+        current = index.get(service_id)
+        if (
+            current is None
+            or task.get("DesiredState") == "running"
+            or current.get("DesiredState") != "running"
+        ):
+            index[service_id] = task
+    return index
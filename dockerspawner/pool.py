@@ -0,0 +1,258 @@
+"""
+A warm pool of running containers
+
+that spawns can claim instead of creating and starting a container.
+
+Pool containers are created from the same options as a user's container,
+minus the per-user parts (name, environment).
+They start with a wrapper command that waits for an environment file,
+which is written in the container when it is claimed,
+before running the real command.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import re
+import secrets
+import time
+from collections import deque
+
+import docker
+
+# label on pool containers, with their pool key
+pool_label = "org.jupyter.dockerspawner.pool"
+
+# where the environment is written in claimed containers
+_env_dir = "/tmp/.jupyterhub-env"
+
+_wait_script = f"""
+while [ ! -e {_env_dir}/ready ]; do sleep 0.1; done
+. {_env_dir}/env
+rm -rf {_env_dir}
+if [ -e {_env_dir} ]; then
+    echo "Failed to remove {_env_dir}" >&2
+    exit 1
+fi
+exec "$@"
+"""
+
+# run as the container's user, with the environment to pass,
+# so the directory and files are private to that user
+_env_script = f"""
+set -e
+umask 077
+mkdir {_env_dir}
+export -p > {_env_dir}/env
+touch {_env_dir}/ready
+echo ok
+"""
+
+_env_name_pattern = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def pool_template(create_kwargs):
+    """Turn a user's create_container kwargs into those for pool containers
+
+    Returns the pool key, which is the same for all users
+    with the same container options, and the kwargs for pool containers.
+    """
+    template = copy.deepcopy(create_kwargs)
+    template.pop("name", None)
+    template["environment"] = {}
+    template["command"] = ["/bin/sh", "-c", _wait_script, "jupyterhub-pool"] + list(
+        template.get("command") or []
+    )
+    key = hashlib.sha256(
+        json.dumps(template, sort_keys=True, default=str).encode("utf8")
+    ).hexdigest()[:12]
+    labels = template.get("labels") or {}
+    if isinstance(labels, list):
+        labels = {label: "" for label in labels}
+    labels[pool_label] = key
+    template["labels"] = labels
+    return key, template
+
+
+def can_inject_env(env):
+    """Whether an environment can be passed to a pool container"""
+    return all(_env_name_pattern.match(key) for key in env)
+
+
+def env_exec_kwargs(container_id, env):
+    """exec_create kwargs to pass an environment to a claimed container
+
+    The environment is written by a process in the container,
+    running as the container's user, with the environment to pass,
+    to a directory only that user can read.
+    The environment is never in an archive or command line,
+    and the wrapper removes it before running the real command.
+    The output of the exec is ``ok`` on success.
+    """
+    return {
+        "container": container_id,
+        "cmd": ["/bin/sh", "-c", _env_script],
+        "environment": {key: str(value) for key, value in env.items()},
+    }
+
+
+class WarmPool:
+    """Running containers waiting to be claimed, for one docker daemon
+
+    Containers are kept per pool key (see :func:`pool_template`).
+    A key's pool is filled in the background up to ``size`` containers
+    the first time it is claimed from, and refilled after every claim,
+    so the first claim for a key always misses.
+    There are never more than ``max_containers`` pool containers in total.
+    Pools that have not been claimed from for ``idle_timeout`` seconds are removed.
+
+    Args:
+        docker: coroutine function making docker calls, like ``DockerSpawner.docker``,
+            but not tied to any one spawner (pools are shared)
+        log: logger
+        name_prefix: prefix for the names of pool containers
+        size: number of containers to keep per key
+        max_containers: maximum number of pool containers in total
+        idle_timeout: remove pools not claimed from for this long
+    """
+
+    def __init__(self, docker, log, name_prefix, size, max_containers, idle_timeout):
+        self.docker = docker
+        self.log = log
+        self.name_prefix = name_prefix
+        self.size = size
+        self.max_containers = max_containers
+        self.idle_timeout = idle_timeout
+        self.pools = {}
+        self._creating = 0
+        self._reaper = None
+
+    @property
+    def total(self):
+        """Number of pool containers, including those being created"""
+        return self._creating + sum(
+            len(pool["containers"]) for pool in self.pools.values()
+        )
+
+    def claim(self, key, template):
+        """Claim a container for a pool key
+
+        Returns the id of a running container, or None if there is none ready.
+        Either way, the pool for the key is (re)filled in the background.
+        """
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                "containers": deque(),
+                "adopted": False,
+                "task": None,
+            }
+        pool["template"] = template
+        pool["last_claim"] = time.monotonic()
+        container_id = None
+        if pool["containers"]:
+            container_id = pool["containers"].popleft()
+        self._start_tasks(key)
+        return container_id
+
+    def _start_tasks(self, key):
+        loop = asyncio.get_running_loop()
+        pool = self.pools[key]
+        task = pool["task"]
+        if task is None or task.done() or task.get_loop() is not loop:
+            pool["task"] = asyncio.ensure_future(self._fill(key))
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap())
+
+    async def _fill(self, key):
+        pool = self.pools[key]
+        try:
+            if not pool["adopted"]:
+                await self._adopt(key)
+                pool["adopted"] = True
+            while (
+                self.pools.get(key) is pool
+                and len(pool["containers"]) < self.size
+                and self.total < self.max_containers
+            ):
+                self._creating += 1
+                try:
+                    container_id = await self._create(key, pool["template"])
+                finally:
+                    self._creating -= 1
+                pool["containers"].append(container_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.log.exception("Error filling warm pool %s", key)
+
+    async def _create(self, key, template):
+        name = f"{self.name_prefix}-{key}-{secrets.token_hex(4)}"
+        obj = await self.docker("create_container", name=name, **template)
+        container_id = obj["Id"]
+        try:
+            await self.docker("start", container_id)
+        except Exception:
+            await self._remove(container_id)
+            raise
+        self.log.info("Added %s to warm pool %s", name, key)
+        return container_id
+
+    async def _adopt(self, key):
+        """Adopt pool containers left by a previous run of the Hub"""
+        containers = await self.docker(
+            "containers",
+            all=True,
+            filters={"label": f"{pool_label}={key}", "name": self.name_prefix},
+        )
+        pool = self.pools[key]
+        for container in containers:
+            name = (container.get("Names") or ["/"])[0].lstrip("/")
+            if not name.startswith(self.name_prefix):
+                # claimed
+                continue
+            full = len(pool["containers"]) >= self.size
+            if container.get("State") == "running" and not full:
+                self.log.info("Adopting %s into warm pool %s", name, key)
+                pool["containers"].append(container["Id"])
+            else:
+                await self._remove(container["Id"])
+
+    async def _remove(self, container_id):
+        try:
+            await self.docker("remove_container", container_id, v=True, force=True)
+        except docker.errors.NotFound:
+            pass
+        except docker.errors.APIError as e:
+            self.log.warning(
+                "Failed to remove warm pool container %s: %s", container_id, e
+            )
+
+    def discard(self, container_id):
+        """Remove a claimed container that turned out to be unusable"""
+        return asyncio.ensure_future(self._remove(container_id))
+
+    async def _reap(self):
+        while self.pools:
+            await asyncio.sleep(min(self.idle_timeout, 60))
+            now = time.monotonic()
+            for key, pool in list(self.pools.items()):
+                if now - pool["last_claim"] < self.idle_timeout:
+                    continue
+                self.log.info(
+                    "Removing warm pool %s, unused for %is", key, self.idle_timeout
+                )
+                del self.pools[key]
+                if pool["task"] is not None:
+                    pool["task"].cancel()
+                for container_id in pool["containers"]:
+                    await self._remove(container_id)
+
+    def stop(self):
+        for pool in self.pools.values():
+            if pool["task"] is not None:
+                pool["task"].cancel()
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
@@ -0,0 +1,118 @@
+"""
+Background pre-pulling of the images users can start
+
+so that the first user to pick an image doesn't wait for the pull.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+
+class ImagePrePuller:
+    """Periodically pull a spawner class's images
+
+    Pulls ``image`` and every image in ``allowed_images``,
+    most popular first (by ``spawner_class.image_popularity``).
+    In ``popular`` mode, only the ``popular_count`` most popular images
+    (and always ``image``) are pulled.
+
+    Up to ``concurrency`` images are pulled at a time,
+    with a spawner created from ``config``,
+    via its ``prepull_image`` method,
+    which waits for pulls needed by spawns before starting.
+
+    The state of each image is kept in :attr:`status`.
+    If ``prepull_image`` returns the state of the pull on each node,
+    it is kept there too, as ``nodes``.
+    """
+
+    def __init__(
+        self, spawner_class, config, log, interval, mode, popular_count, concurrency=1
+    ):
+        self.spawner_class = spawner_class
+        self.config = config
+        self.log = log
+        self.interval = interval
+        self.mode = mode
+        self.popular_count = popular_count
+        self.concurrency = concurrency
+        self.status = {}
+        self.task = None
+
+    def start(self):
+        """Start pre-pulling, if not already running"""
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def get_images(self, spawner):
+        """The images to pull, in order"""
+        default_image = spawner.image
+        allowed_images = spawner.allowed_images
+        if callable(allowed_images) or allowed_images == "*":
+            # per-user or unrestricted images can't be known ahead of time
+            images = []
+        else:
+            images = list(dict.fromkeys(allowed_images.values()))
+        if default_image not in images:
+            images.append(default_image)
+        popularity = self.spawner_class.image_popularity
+        # sorted is stable, so unused images keep their configured order
+        images.sort(key=lambda image: popularity[image], reverse=True)
+        if self.mode == "popular":
+            popular = images[: self.popular_count]
+            if default_image not in popular:
+                popular.append(default_image)
+            images = popular
+        return images
+
+    async def _run(self):
+        while True:
+            try:
+                await self.pull_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.log.exception("Error pre-pulling images")
+            await asyncio.sleep(self.interval)
+
+    async def pull_all(self):
+        """Pull all images once"""
+        spawner = self.spawner_class(config=self.config, log=self.log)
+        images = self.get_images(spawner)
+        self.log.info("Pre-pulling %i images: %s", len(images), ", ".join(images))
+        # semaphores are fair, so pulls start in order
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+
+        async def pull(image):
+            async with semaphore:
+                await self._pull_one(spawner, image)
+
+        await asyncio.gather(*(pull(image) for image in images))
+        for image in set(self.status).difference(images):
+            # no longer pulled
+            self.status.pop(image)
+
+    async def _pull_one(self, spawner, image):
+        status = self.status.setdefault(image, {})
+        status["status"] = "pulling"
+        start = time.perf_counter()
+        try:
+            nodes = await spawner.prepull_image(image)
+        except Exception as e:
+            self.log.error("Failed to pre-pull %s: %s", image, e)
+            status["status"] = "failed"
+            status["error"] = str(e)
+        else:
+            status["status"] = "ready"
+            status.pop("error", None)
+            if nodes is not None:
+                status["nodes"] = nodes
+        status["duration"] = time.perf_counter() - start
+        status["last_pull"] = datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,147 @@
+"""
+Progress of image pulls
+
+aggregated from the messages streamed by docker while pulling.
+"""
+
+import time
+
+# fraction of a layer done once it is downloaded, the rest is extraction
+_downloaded_fraction = 0.9
+
+
+def format_bytes(n):
+    """Human-readable size"""
+    for unit in ("B", "kB", "MB", "GB"):
+        if n < 1000:
+            break
+        n /= 1000
+    else:
+        unit = "TB"
+    if unit == "B":
+        return f"{n:.0f} {unit}"
+    return f"{n:.1f} {unit}"
+
+
+class PullProgress:
+    """The progress of one image pull
+
+    Feed it the decoded progress messages of a pull with :meth:`update`.
+    Tracks the bytes downloaded per layer,
+    from which the overall percentage and throughput are computed.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.layers = {}
+        self.status = "waiting"
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.status = "pulling"
+        self.start_time = time.monotonic()
+
+    def finish(self, error=None):
+        self.end_time = time.monotonic()
+        if error is None:
+            self.status = "done"
+        else:
+            self.status = "failed"
+            self.error = str(error)
+
+    def update(self, msg):
+        """Record one progress message"""
+        layer_id = msg.get("id")
+        status = msg.get("status", "")
+        if not layer_id or status.startswith("Pulling from"):
+            # not about a layer
+            return
+        layer = self.layers.setdefault(
+            layer_id, {"size": 0, "downloaded": 0, "fraction": 0.0}
+        )
+        detail = msg.get("progressDetail") or {}
+        if status == "Downloading":
+            if detail.get("total"):
+                layer["size"] = detail["total"]
+                layer["downloaded"] = detail.get("current", 0)
+                layer["fraction"] = (
+                    _downloaded_fraction * layer["downloaded"] / layer["size"]
+                )
+        elif status in {"Verifying Checksum", "Download complete"}:
+            layer["downloaded"] = layer["size"]
+            layer["fraction"] = _downloaded_fraction
+        elif status == "Extracting":
+            layer["downloaded"] = layer["size"]
+            if detail.get("total"):
+                layer["fraction"] = (
+                    _downloaded_fraction
+                    + (1 - _downloaded_fraction)
+                    * detail.get("current", 0)
+                    / detail["total"]
+                )
+        elif status in {"Pull complete", "Already exists"}:
+            layer["downloaded"] = layer["size"]
+            layer["fraction"] = 1.0
+
+    @property
+    def percent(self):
+        """Overall progress, in percent"""
+        if self.status == "done":
+            return 100
+        if not self.layers:
+            return 0
+        fractions = [layer["fraction"] for layer in self.layers.values()]
+        return int(100 * sum(fractions) / len(fractions))
+
+    @property
+    def bytes_downloaded(self):
+        return sum(layer["downloaded"] for layer in self.layers.values())
+
+    @property
+    def bytes_total(self):
+        """Total size of the layers being downloaded, as far as it is known yet"""
+        return sum(layer["size"] for layer in self.layers.values())
+
+    @property
+    def duration(self):
+        if self.start_time is None:
+            return 0
+        end = self.end_time or time.monotonic()
+        return end - self.start_time
+
+    @property
+    def rate(self):
+        """Download throughput, in bytes per second"""
+        duration = self.duration
+        if not duration:
+            return 0
+        return self.bytes_downloaded / duration
+
+    @property
+    def message(self):
+        if self.status == "waiting":
+            return f"Waiting to pull image {self.image}"
+        elif self.status == "failed":
+            return f"Failed to pull image {self.image}: {self.error}"
+        elif self.status == "done":
+            return (
+                f"Pulled image {self.image}"
+                f" ({format_bytes(self.bytes_downloaded)} in {self.duration:.0f}s)"
+            )
+        return (
+            f"Pulling image {self.image}: {self.percent}%"
+            f" ({format_bytes(self.bytes_downloaded)}"
+            f" of {format_bytes(self.bytes_total)},"
+            f" {format_bytes(self.rate)}/s)"
+        )
+
+    def stats(self):
+        """Summary of a finished pull, for metrics"""
+        return {
+            "status": self.status,
+            "duration": self.duration,
+            "bytes": self.bytes_downloaded,
+            "layers": len(self.layers),
+        }
@@ -3,6 +3,10 @@ A Spawner for JupyterHub that runs each user's server in a separate docker servi
 """
 
 import asyncio
+import hashlib
+import json
+import os
+from functools import partial
 from pprint import pformat
 from textwrap import dedent
 
@@ -14,11 +18,53 @@ from docker.types import (
     Mount,
     Placement,
     Resources,
+    RestartPolicy,
+    SecretReference,
+    ServiceMode,
     TaskTemplate,
 )
-from traitlets import Dict, Unicode, default
+from traitlets import Bool, Dict, Float, Int, Unicode, default
 
 from .dockerspawner import DockerSpawner
+from .events import task_from_container
+from .poller import SnapshotPoller, index_tasks
+
+# task states that will never become running
+_task_failed_states = {"rejected", "failed", "orphaned"}
+# task states of finished tasks
+_task_done_states = {"complete", "shutdown", "remove"} | _task_failed_states
+# label on pre-pull jobs, with their image
+prepull_label = "org.jupyter.dockerspawner.prepull"
+# label on internal ssl cert secrets, with the name of their service
+certs_label = "org.jupyter.dockerspawner.certs"
+
+# task states poll considers running
+_task_running_states = {"running", "starting", "pending", "preparing"}
+# task states that may still become running
+_task_pending_states = {
+    "new",
+    "allocated",
+    "pending",
+    "assigned",
+    "accepted",
+    "preparing",
+    "ready",
+    "starting",
+}
+
+
+def _prepull_state(task):
+    """The state of the pull of a pre-pull job's task on its node
+
+    A task whose container was created got its image,
+    even if the container's command then failed.
+    """
+    status = task["Status"]
+    state = status["State"]
+    container_status = status.get("ContainerStatus") or {}
+    if state in _task_failed_states and container_status.get("ContainerID"):
+        return {"state": "complete", "error": None}
+    return {"state": state, "error": status.get("Err")}
 
 
 class SwarmSpawner(DockerSpawner):
@@ -104,6 +150,104 @@ class SwarmSpawner(DockerSpawner):
     # container-removal cannot be disabled for services
     remove = True
 
+    suspend_services = Bool(
+        False,
+        config=True,
+        help="""Scale services to 0 replicas when servers are stopped, instead of removing them.
+
+        Starting the server again scales the service back to 1,
+        skipping creation of the service
+        and keeping its virtual IP and published port.
+        If the image has changed in the meantime,
+        the service is removed and created again.
+
+        This is SwarmSpawner's equivalent of ``stop_mode = 'pause'``,
+        which it ignores.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    @property
+    def will_resume(self):
+        # the service, with the API token in its environment, is kept
+        return self.suspend_services
+
+    # whether my service has been scaled to 0 by stop
+    suspended = False
+
+    def load_state(self, state):
+        super().load_state(state)
+        self.suspended = state.get("suspended", False)
+
+    def get_state(self):
+        state = super().get_state()
+        if self.object_id and self.suspended:
+            state["suspended"] = True
+        return state
+
+    def _object_env(self, obj):
+        return obj["Spec"]["TaskTemplate"]["ContainerSpec"].get("Env") or []
+
+    def _can_resume(self, service):
+        """Whether a suspended service can be scaled up again"""
+        image = service["Spec"]["TaskTemplate"]["ContainerSpec"]["Image"]
+        # swarm pins the image digest
+        return image.split("@", 1)[0] == self.image
+
+    async def _find_object(self):
+        if self.suspend_services and self.suspended:
+            service = await self.get_object()
+            if service and self._can_resume(service):
+                self._start_memo.update(object=service, paused=False, suspended=True)
+                return
+        self.suspended = False
+        await super()._find_object()
+
+    async def _scale_service(self, replicas, service=None):
+        if service is None:
+            service = await self.docker("inspect_service", self.service_id)
+        await self.docker(
+            "update_service",
+            self.service_id,
+            version=service["Version"]["Index"],
+            mode=ServiceMode("replicated", replicas=replicas),
+            fetch_current_spec=True,
+        )
+
+    async def _resume_service(self, service):
+        """Scale a suspended service back up"""
+        # tasks from before the service was suspended
+        # shouldn't be mistaken for failures to start
+        old_tasks = await self._get_service_tasks()
+        self._start_memo["old_tasks"] = {task["ID"] for task in old_tasks}
+        self.log.info("Resuming suspended service %s", self.service_name)
+        await self._scale_service(1, service)
+        self.suspended = False
+        # the published port doesn't change
+        self._start_memo["started"] = service
+
+    async def _stop(self, now=False):
+        if not self.suspend_services:
+            await super()._stop(now=now)
+            if self.internal_ssl and self.certs_as_secrets:
+                await self._remove_cert_secrets()
+            return
+        if self.object_id:
+            self.log.info(
+                "Suspending service %s (id: %s)", self.service_name, self.service_id[:7]
+            )
+            try:
+                await self._scale_service(0)
+            except APIError as e:
+                if e.status_code == 404:
+                    self.log.info("Service '%s' is gone", self.service_name)
+                    self.object_id = ""
+                else:
+                    raise
+        self.suspended = bool(self.object_id)
+        self.clear_state()
+
     @property
     def mount_driver_config(self):
         if self.volume_driver:
@@ -130,6 +274,115 @@ class SwarmSpawner(DockerSpawner):
         else:
             return []
 
+    @property
+    def volume_binds(self):
+        binds = super().volume_binds
+        if self.internal_ssl and self.certs_as_secrets:
+            # the certs are mounted from secrets instead
+            binds.pop(self.format_volume_name(self.certs_volume_name, self), None)
+        return binds
+
+    @default("certs_staging")
+    def _default_certs_staging(self):
+        # services have no created container to put the certs in
+        return "volume"
+
+    certs_as_secrets = Bool(
+        True,
+        config=True,
+        help="""Deliver internal SSL certificates as swarm secrets.
+
+        Each cert file is a secret, named after the service and the file's content,
+        mounted in /certs, on whichever node the service runs.
+        The secrets are removed when the server stops.
+        With ``suspend_services``, a resumed service keeps its secrets,
+        which are removed with the service.
+
+        If False, the certs are staged in a volume (see ``certs_volume_name``),
+        which is only populated on the Hub's node.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # SecretReferences of my certs
+    _cert_secrets = ()
+    # the secrets must exist before the service referencing them
+    _certs_before_create = True
+    # resumed services keep their secrets,
+    # and a service being replaced has its secrets removed first
+    _certs_after_object = True
+
+    async def move_certs(self, paths):
+        """Create secrets with the internal ssl certs
+
+        Returns the paths of the certs in the container right away.
+        The secrets are created in a phase of start,
+        before the service referencing them.
+        """
+        if not self.certs_as_secrets:
+            return await super().move_certs(paths)
+        nb_paths = {
+            key: "/certs/" + os.path.basename(hub_path)
+            for key, hub_path in paths.items()
+        }
+        self._certs_staging = partial(self._create_cert_secrets, paths, nb_paths)
+        return nb_paths
+
+    async def _list_cert_secrets(self):
+        return await self.docker(
+            "secrets", filters={"label": f"{certs_label}={self.object_name}"}
+        )
+
+    async def _create_cert_secrets(self, paths, nb_paths):
+        if self._start_memo is not None and self._start_memo.get("suspended"):
+            # the service's spec keeps referencing its secrets
+            self.log.info(
+                "Resuming with existing ssl cert secrets for %s", self._log_name
+            )
+            return
+        self.log.info("Creating ssl cert secrets for %s", self._log_name)
+        existing = {
+            secret["Spec"]["Name"]: secret["ID"]
+            for secret in await self._list_cert_secrets()
+        }
+        secrets = []
+        for key, hub_path in paths.items():
+            with open(hub_path, "rb") as f:
+                content = f.read()
+            # secrets can't be updated, new certs get new secrets
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            name = f"{self.object_name[:40]}-{key}-{digest}"
+            secret_id = existing.get(name)
+            if secret_id is None:
+                secret = await self.docker(
+                    "create_secret",
+                    name,
+                    content,
+                    labels={certs_label: self.object_name},
+                )
+                secret_id = secret["ID"]
+            secrets.append(SecretReference(secret_id, name, filename=nb_paths[key]))
+        self._cert_secrets = secrets
+
+    async def _remove_cert_secrets(self, keep=()):
+        """Remove the secrets of my certs, except the SecretReferences in ``keep``"""
+        keep_ids = {secret["SecretID"] for secret in keep}
+        for secret in await self._list_cert_secrets():
+            if secret["ID"] in keep_ids:
+                continue
+            try:
+                await self.docker("remove_secret", secret["ID"])
+            except APIError as e:
+                # already gone, or still used by a service
+                if e.status_code in {404, 409}:
+                    self.log.debug(
+                        "Not removing secret %s: %s", secret["Spec"]["Name"], e
+                    )
+                else:
+                    raise
+        self._cert_secrets = tuple(keep)
+
     async def poll(self):
         """Check for my id in `docker ps`"""
         service = await self.get_task()
@@ -142,55 +395,160 @@ class SwarmSpawner(DockerSpawner):
             "Service %s status: %s", self.service_id[:7], pformat(service_state)
         )
 
-        if service_state["State"] in {"running", "starting", "pending", "preparing"}:
+        if service_state["State"] in _task_running_states:
             return None
 
         else:
             return pformat(service_state)
 
-    async def get_task(self):
-        self.log.debug("Getting task of service '%s'", self.service_name)
-        if await self.get_object() is None:
-            return None
+    def _get_event_filters(self):
+        filters = super()._get_event_filters()
+        filters["type"].append("service")
+        return filters
+
+    # shared pollers, by filters
+    _task_pollers = {}
+
+    def _get_task_poller(self):
+        key = json.dumps(self.batch_poll_filters, sort_keys=True)
+        pollers = self._task_pollers
+        if key not in pollers:
+            pollers[key] = SnapshotPoller(max_age=self.batch_poll_max_age)
+        return pollers[key]
+
+    async def _list_tasks(self):
+        tasks = await self.docker("tasks", filters=self.batch_poll_filters)
+        for task in tasks:
+            if task["Status"]["State"] == "running":
+                self._record_image_node(
+                    task["Spec"]["ContainerSpec"]["Image"], task.get("NodeID")
+                )
+        return index_tasks(tasks)
+
+    image_locality = Bool(
+        False,
+        config=True,
+        help="""Place services on nodes that already have their image.
+
+        Nodes are known to have an image once a task with that image
+        has been seen running there, while starting servers
+        or in the shared listing of ``batch_poll``.
+        A new service is constrained to those nodes,
+        so the user doesn't wait for the image to be pulled,
+        and swarm still picks among them as usual.
+        If no node is known to have the image, placement is unconstrained,
+        and if the task can't be scheduled on any of those nodes,
+        the service is created again without the constraint.
+        Nodes that have left the swarm are forgotten.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # nodes where images have been seen running,
+    # by docker_base_url, then image
+    _image_nodes_by_url = {}
+
+    @property
+    def _image_nodes(self):
+        return self._image_nodes_by_url.setdefault(self.docker_base_url, {})
 
+    def _record_image_node(self, image, node_id):
+        if not (self.image_locality and node_id):
+            return
+        # swarm pins the image digest
+        image = image.split("@", 1)[0]
+        self._image_nodes.setdefault(image, set()).add(node_id)
+
+    async def _get_image_node_constraints(self):
+        """Placement constraints keeping my service on nodes that have my image
+
+        Returns a list of constraints excluding the nodes that don't have it,
+        empty if no node (or every node) is known to have it.
+        """
+        node_ids = {node["ID"] for node in await self.docker("nodes")}
+        image_nodes = self._image_nodes
+        # forget nodes that have left the swarm
+        for image, nodes in list(image_nodes.items()):
+            nodes.intersection_update(node_ids)
+            if not nodes:
+                del image_nodes[image]
+        nodes = image_nodes.get(self.image, set()).difference(self._excluded_nodes)
+        if not nodes:
+            return []
+        return [f"node.id!={node_id}" for node_id in sorted(node_ids - nodes)]
+
+    async def _get_listed_task(self):
+        """Look up my service's task in the shared task listing
+
+        Returns None if it is not listed.
+        """
+        if not self.service_id:
+            return None
+        poller = self._get_task_poller()
         try:
-            tasks = await self.docker(
-                "tasks",
-                filters={"service": self.service_name, "desired-state": "running"},
-            )
-            if len(tasks) == 0:
-                tasks = await self.docker(
-                    "tasks",
-                    filters={"service": self.service_name},
-                )
-                if len(tasks) == 0:
-                    return None
+            listing = await poller.get(self._list_tasks)
+        except Exception as e:
+            self.log.warning("Failed to list tasks for polling: %s", e)
+            return None
+        return listing.get(self.service_id)
 
-            elif len(tasks) > 1:
-                raise RuntimeError(
-                    "Found more than one running notebook task for service '{}'".format(
-                        self.service_name
-                    )
-                )
+    async def get_task(self):
+        self.log.debug("Getting task of service '%s'", self.service_name)
+        watcher = self.event_watcher
+        if watcher and watcher.ready:
+            if self.service_name in watcher.removed_services:
+                self.log.info("Service '%s' is gone", self.service_name)
+                return None
+            # only containers on this node are visible in events,
+            # ask the manager about anything else
+            entry = watcher.get_service_container(self.service_name)
+            if entry and entry["State"].get("Running"):
+                return task_from_container(entry)
+
+        if self.batch_poll:
+            task = await self._get_listed_task()
+            if task and task["Status"]["State"] in _task_running_states:
+                return task
+            # not running or not listed, ask about my service
 
-            task = tasks[0]
+        try:
+            # listing the tasks of a service that doesn't exist is a 404,
+            # so there's no need to inspect the service first
+            tasks = await self._get_service_tasks()
         except APIError as e:
-            if e.response.status_code == 404:
+            if e.response.status_code in {404, 500}:
                 self.log.info("Task for service '%s' is gone", self.service_name)
-                task = None
+                # my service is gone, forget my id
+                self.object_id = ""
+                return None
             else:
                 raise
 
-        return task
+        running = [task for task in tasks if task.get("DesiredState") == "running"]
+        if len(running) > 1:
+            raise RuntimeError(
+                "Found more than one running notebook task for service '{}'".format(
+                    self.service_name
+                )
+            )
+        if running:
+            return running[0]
+        elif tasks:
+            return tasks[0]
+        else:
+            return None
 
     async def create_object(self):
         """Start the single-user server in a docker service."""
         container_kwargs = dict(
             image=self.image,
             env=self.get_env(),
-            args=(await self.get_command()),
+            args=(await self._get_start_command()),
             mounts=self.mounts,
         )
+        if self._cert_secrets:
+            container_kwargs["secrets"] = list(self._cert_secrets)
         container_kwargs.update(self.extra_container_spec)
         container_spec = ContainerSpec(**container_kwargs)
 
@@ -211,6 +569,25 @@ class SwarmSpawner(DockerSpawner):
             platforms=None,
         )
         placement_kwargs.update(self.extra_placement_spec)
+        constraints = list(placement_kwargs["constraints"] or [])
+        if self._excluded_nodes:
+            # retrying after a failure, avoid the nodes that failed
+            constraints.extend(
+                f"node.id!={node_id}" for node_id in self._excluded_nodes
+            )
+        memo = self._start_memo
+        image_constraints = []
+        if self.image_locality and (memo is None or memo.get("image_locality", True)):
+            image_constraints = await self._get_image_node_constraints()
+        if image_constraints:
+            self.log.debug(
+                "Placing %s on nodes with image %s", self.service_name, self.image
+            )
+            constraints.extend(image_constraints)
+        if memo is not None:
+            memo["image_constraints"] = image_constraints
+        if constraints:
+            placement_kwargs["constraints"] = constraints
         placement_spec = Placement(**placement_kwargs)
 
         task_kwargs = dict(
@@ -235,17 +612,150 @@ class SwarmSpawner(DockerSpawner):
 
         service = await self.docker("create_service", **create_kwargs)
 
+        delay = self.task_poll_interval
         while True:
-            tasks = await self.docker(
-                "tasks",
-                filters={"service": self.service_name},
-            )
+            tasks = await self._get_service_tasks()
             if len(tasks) > 0:
                 break
-            await asyncio.sleep(1)
+            delay = await self._wait_for_task_change(delay)
 
+        if self._start_memo is not None:
+            # start_object's first check
+            self._start_memo["tasks"] = tasks
         return service
 
+    task_poll_interval = Float(
+        1,
+        config=True,
+        help="""Interval (in seconds) for checking on tasks while starting.
+
+        With ``watch_events``, checks are also made as soon as
+        events arrive for the service, or its containers on the Hub's node,
+        so this is only a fallback for tasks on other nodes.
+        Without it, this is the first interval,
+        backing off exponentially to at most 11 seconds between checks.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    async def _wait_for_task_change(self, delay, service_name=None):
+        """Wait until it's time to check on my service's tasks again
+
+        ``delay`` is the time to wait without events.
+        Returns the delay for the next wait.
+        """
+        watcher = self.event_watcher
+        if watcher and watcher.ready:
+            await watcher.wait_for_change(
+                self.task_poll_interval, service_name=service_name or self.service_name
+            )
+            return delay
+        await asyncio.sleep(delay)
+        # exponential backoff
+        return min(delay * 1.5, max(self.task_poll_interval, 11))
+
+    @property
+    def _prepull_enabled(self):
+        # images are pulled on the nodes, not by the Hub's docker client,
+        # so pull_policy doesn't apply
+        return bool(self.prepull_interval)
+
+    prepull_job_timeout = Float(
+        600,
+        config=True,
+        help="""Maximum time (in seconds) for pre-pulling an image on the nodes.
+
+        With SwarmSpawner, ``prepull_interval`` pre-pulls images on every node
+        that servers can be placed on (per ``extra_placement_spec``),
+        with a global job service per image,
+        whose tasks pull the image and exit.
+        The job is removed when all of its tasks are done,
+        or after this timeout, e.g. when some nodes are down.
+
+        Pre-pulling can also be run on demand,
+        e.g. before a workshop, with ``await spawner.prepuller.pull_all()``.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    async def prepull_image(self, image):
+        """Pull an image on every node servers can be placed on
+
+        Returns the state of the pull on each node, by node id.
+        """
+        digest = hashlib.sha256(image.encode("utf8")).hexdigest()[:12]
+        name = f"{self.prefix}-prepull-{digest}"
+        # left over by an interrupted pre-pull
+        await self._remove_prepull_job(name)
+        task_template = TaskTemplate(
+            # a service's command replaces the image's entrypoint.
+            # The image may not have `true` (e.g. distroless images),
+            # in which case the task fails after the pull, see _prepull_state
+            container_spec=ContainerSpec(image=image, command=["true"], args=[]),
+            placement=Placement(**self.extra_placement_spec),
+            restart_policy=RestartPolicy(condition="none"),
+        )
+        self.log.info("Pre-pulling %s on swarm nodes", image)
+        await self.docker(
+            "create_service",
+            task_template=task_template,
+            name=name,
+            labels={prepull_label: image},
+            mode=ServiceMode("global-job"),
+        )
+        nodes = {}
+        try:
+            deadline = asyncio.get_running_loop().time() + self.prepull_job_timeout
+            done = 0
+            delay = self.task_poll_interval
+            while asyncio.get_running_loop().time() < deadline:
+                tasks = await self.docker("tasks", filters={"service": name})
+                for task in tasks:
+                    nodes[task.get("NodeID")] = _prepull_state(task)
+                finished = [
+                    task
+                    for task in tasks
+                    if task["Status"]["State"] in _task_done_states
+                ]
+                if len(finished) != done:
+                    done = len(finished)
+                    self.log.info(
+                        "Pre-pulling %s: done on %i/%i nodes", image, done, len(tasks)
+                    )
+                if tasks and len(finished) == len(tasks):
+                    break
+                delay = await self._wait_for_task_change(delay, service_name=name)
+            else:
+                self.log.warning(
+                    "Pre-pulling %s: timeout after %is, done on %i/%i nodes",
+                    image,
+                    self.prepull_job_timeout,
+                    done,
+                    len(nodes),
+                )
+        finally:
+            await self._remove_prepull_job(name)
+        for node_id, node in nodes.items():
+            if node["state"] == "complete":
+                self._record_image_node(image, node_id)
+            elif node["state"] in _task_done_states:
+                self.log.warning(
+                    "Pre-pulling %s failed on node %s: %s",
+                    image,
+                    node_id,
+                    node["error"] or node["state"],
+                )
+        return nodes
+
+    async def _remove_prepull_job(self, name):
+        try:
+            await self.docker("remove_service", name)
+        except APIError as e:
+            if e.status_code != 404:
+                raise
+
     @property
     def internal_hostname(self):
         return self.service_name
@@ -253,7 +763,83 @@ class SwarmSpawner(DockerSpawner):
     async def remove_object(self):
         self.log.info("Removing %s %s", self.object_type, self.object_id)
         # remove the container, as well as any associated volumes
-        await self.docker("remove_" + self.object_type, self.object_id)
+        try:
+            await self.docker("remove_" + self.object_type, self.object_id)
+        except APIError as e:
+            if e.status_code == 404:
+                self.log.debug(
+                    "Already removed %s: %s", self.object_type, self.object_id
+                )
+            else:
+                raise
+        if self.internal_ssl and self.certs_as_secrets:
+            # e.g. a suspended service replaced because its image changed,
+            # keeping the secrets created for its replacement
+            await self._remove_cert_secrets(keep=self._cert_secrets)
+
+    task_retries = Int(
+        0,
+        config=True,
+        help="""Number of times to recreate a service whose task fails to start.
+
+        When a task is rejected or fails while starting
+        (e.g. the image can't be pulled on its node),
+        the service is removed, and recreated with a placement constraint
+        excluding the nodes where it failed.
+        Once retries are exhausted, the task's error is the spawn error.
+
+        .. versionadded:: 14.1
+        """,
+    )
+
+    # nodes where tasks failed during the current start
+    _excluded_nodes = ()
+    # retries made during the current start
+    _task_retries_used = 0
+
+    async def _get_service_tasks(self):
+        """All tasks of my service, most recent first
+
+        During start, the tasks listed after creating the service
+        are used once, instead of listing them again.
+        """
+        memo = self._start_memo
+        if memo is not None and "tasks" in memo:
+            return memo.pop("tasks")
+        tasks = await self.docker("tasks", filters={"service": self.service_name})
+        return sorted(tasks, key=lambda task: task.get("CreatedAt", ""), reverse=True)
+
+    async def _fail_task(self, task):
+        """Handle a task that failed while starting
+
+        Removes the service, then recreates it (returns)
+        if there are retries left, or raises with the task's error.
+        """
+        status = task["Status"]
+        error = status.get("Err") or status.get("Message") or status["State"]
+        node_id = task.get("NodeID")
+        await self.remove_object()
+        self.object_id = ""
+        retries = self._task_retries_used
+        if retries >= self.task_retries:
+            raise RuntimeError(
+                f"Service {self.service_name} task {status['State']}: {error}"
+            )
+        self.log.warning(
+            "Service %s task %s on node %s: %s, retrying (%i/%i)",
+            self.service_name,
+            status["State"],
+            node_id or "(none)",
+            error,
+            retries + 1,
+            self.task_retries,
+        )
+        self._task_retries_used += 1
+        if node_id:
+            # tasks rejected before being assigned have no node
+            self._excluded_nodes = self._excluded_nodes + (node_id,)
+        obj = await self.create_object()
+        self.object_id = obj[self.object_id_key]
 
     async def start_object(self):
         """Not actually starting anything
@@ -265,33 +851,77 @@ class SwarmSpawner(DockerSpawner):
         not just requested.
         """
 
-        dt = 1.0
-
+        memo = self._start_memo
+        if memo is not None and memo.get("suspended"):
+            await self._resume_service(memo["object"])
+        try:
+            await self._wait_for_running_task()
+        finally:
+            self._excluded_nodes = ()
+            self._task_retries_used = 0
+
+    async def _wait_for_running_task(self):
+        memo = self._start_memo
+        old_tasks = memo.get("old_tasks", ()) if memo is not None else ()
+        last_error = None
+        delay = self.task_poll_interval
+        deadline = asyncio.get_running_loop().time() + self.start_timeout
         while True:
-            service = await self.get_task()
-            if not service:
-                raise RuntimeError("Service %s not found" % self.service_name)
+            try:
+                tasks = await self._get_service_tasks()
+            except APIError as e:
+                if e.status_code == 404:
+                    raise RuntimeError("Service %s not found" % self.service_name)
+                raise
+            tasks = [task for task in tasks if task.get("ID") not in old_tasks]
+            failed = [
+                task
+                for task in tasks
+                if task["Status"]["State"].lower() in _task_failed_states
+            ]
+            if failed:
+                # don't wait for swarm to replace the task,
+                # it would likely fail the same way
+                await self._fail_task(failed[0])
+                continue
+            if not tasks:
+                # e.g. resuming, and swarm hasn't scheduled the new task yet
+                if asyncio.get_running_loop().time() >= deadline:
+                    raise RuntimeError(
+                        f"Service {self.service_name} has no task"
+                        f" after {self.start_timeout}s"
+                    )
+                delay = await self._wait_for_task_change(delay)
+                continue
 
-            status = service["Status"]
+            status = tasks[0]["Status"]
             state = status["State"].lower()
             self.log.debug("Service %s state: %s", self.service_id[:7], state)
-            if state in {
-                "new",
-                "assigned",
-                "accepted",
-                "starting",
-                "pending",
-                "preparing",
-                "ready",
-                "rejected",
-            }:
+            if state in _task_pending_states:
+                error = status.get("Err")
+                if error and memo is not None and memo.get("image_constraints"):
+                    self.log.info(
+                        "Service %s can't be placed on nodes with its image: %s."
+                        " Placing it anywhere.",
+                        self.service_name,
+                        error,
+                    )
+                    memo["image_locality"] = False
+                    await self.remove_object()
+                    obj = await self.create_object()
+                    self.object_id = obj[self.object_id_key]
+                    continue
+                if error and error != last_error:
+                    # e.g. no suitable node
+                    self.log.info("Service %s %s: %s", self.service_name, state, error)
+                    last_error = error
                 # not ready yet, wait before checking again
-                await asyncio.sleep(dt)
-                # exponential backoff
-                dt = min(dt * 1.5, 11)
+                delay = await self._wait_for_task_change(delay)
             else:
                 break
-        if state != "running":
+        if state == "running":
+            self._record_image_node(self.image, tasks[0].get("NodeID"))
+        else:
             raise RuntimeError(
                 f"Service {self.service_name} not running: {pformat(status)}"
             )
@@ -321,7 +951,8 @@ class SwarmSpawner(DockerSpawner):
         else:
             # discover published ip, port
             ip = self.host_ip
-            service = await self.get_object()
+            # published ports are only in the service, not its tasks
+            service = await self._inspect_started_object()
             for port_config in service["Endpoint"]["Ports"]:
                 if port_config.get("TargetPort") == self.port:
                     port = port_config["PublishedPort"]
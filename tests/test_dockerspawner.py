@@ -1,10 +1,16 @@
 """Tests for DockerSpawner class"""
 
 import asyncio
+import gc
 import json
 import logging
 import os
 import string
+import tarfile
+import threading
+import time
+import weakref
+from collections import Counter
 from unittest import mock
 
 import docker
@@ -14,10 +20,24 @@ from escapism import escape
 from jupyterhub.tests.mocking import public_url
 from jupyterhub.tests.test_api import add_user, api_request
 from jupyterhub.utils import url_path_join
+from prometheus_client import REGISTRY
 from tornado.httpclient import AsyncHTTPClient
 from traitlets.config import Config
 
 from dockerspawner import DockerSpawner
+from dockerspawner.bulkstop import StopBatcher
+from dockerspawner.dockerspawner import _docker_lane_name, _DockerLane
+from dockerspawner.events import DockerEventWatcher
+from dockerspawner.phases import PhaseGraph
+from dockerspawner.pool import (
+    WarmPool,
+    can_inject_env,
+    env_exec_kwargs,
+    pool_label,
+    pool_template,
+)
+from dockerspawner.prepuller import ImagePrePuller
+from dockerspawner.pullprogress import PullProgress
 
 
 def test_name_collision(dockerspawner_configured_app):
@@ -38,8 +58,9 @@ def test_name_collision(dockerspawner_configured_app):
     assert spawner1.object_name != spawner2.object_name
 
 
+@pytest.mark.parametrize("backend", ("threads", "asyncio"))
 @pytest.mark.parametrize("remove", (True, False))
-async def test_start_stop(dockerspawner_configured_app, remove):
+async def test_start_stop(dockerspawner_configured_app, remove, backend):
     app = dockerspawner_configured_app
     name = "has@"
     add_user(app.db, app, name=name)
@@ -48,6 +69,7 @@ async def test_start_stop(dockerspawner_configured_app, remove):
     spawner = user.spawners[server_name]
     assert isinstance(spawner, DockerSpawner)
     spawner.remove = remove
+    spawner.docker_backend = backend
     token = user.new_api_token()
     # start the server
     r = await api_request(app, "users", name, "servers", server_name, method="post")
@@ -439,3 +461,889 @@ def test_legacy_escape(dockerspawner_configured_app):
     assert spawner._legacy_escape(container_name) == escape(
         container_name, safe_chars, escape_char='_'
     )
+
+
+@pytest.mark.parametrize(
+    "method, lane",
+    [
+        ("pull", "pull"),
+        ("inspect_container", "read"),
+        ("inspect_image", "read"),
+        ("port", "read"),
+        ("tasks", "read"),
+        ("create_container", "lifecycle"),
+        ("stop", "lifecycle"),
+        ("remove_service", "lifecycle"),
+    ],
+)
+def test_docker_lane_name(method, lane):
+    assert _docker_lane_name(method) == lane
+
+
+def test_docker_lanes_config():
+    spawner = DockerSpawner(docker_lanes={"pull": {"threads": 8}})
+    lanes = spawner._get_docker_lane_config()
+    assert lanes["pull"] == {"threads": 8, "queue": 32}
+    assert lanes["read"] == {"threads": 4, "queue": 256}
+    with pytest.raises(ValueError):
+        spawner.docker_lanes = {"nosuchlane": {"threads": 1}}
+    with pytest.raises(ValueError):
+        spawner.docker_lanes = {"read": {"threads": 0}}
+
+
+async def test_docker_lane_full():
+    lane = _DockerLane("test", threads=1, queue=1)
+    futures = [asyncio.ensure_future(lane.submit(time.sleep, 0.1)) for i in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(RuntimeError, match="Too many docker calls"):
+        await lane.submit(time.sleep, 0.1)
+    await asyncio.gather(*futures)
+    # room again
+    await lane.submit(time.sleep, 0)
+    lane.executor.shutdown()
+
+
+async def test_batch_poll():
+    calls = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "containers":
+            await asyncio.sleep(0.1)
+            return [
+                {"Id": "abc123", "Names": ["/jupyter-a"], "State": "running"},
+                {"Id": "def456", "Names": ["/jupyter-b"], "State": "exited"},
+            ]
+        elif method == "inspect_container":
+            return {
+                "Id": "def456",
+                "State": {
+                    "Running": False,
+                    "ExitCode": 1,
+                    "Error": "",
+                    "FinishedAt": "now",
+                },
+            }
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    spawners = []
+    for name in ["jupyter-a", "jupyter-a", "jupyter-b"]:
+        spawner = DockerSpawner(batch_poll=True, object_name=name)
+        spawner.docker = mock_docker
+        spawners.append(spawner)
+
+    results = await asyncio.gather(*(spawner.poll() for spawner in spawners))
+    assert results == [None, None, "ExitCode=1, Error='', FinishedAt=now"]
+    assert sorted(calls) == ["containers", "inspect_container"]
+    assert spawners[0].object_id == "abc123"
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-events.sock")
+async def test_watch_events():
+    events = asyncio.Queue()
+
+    async def mock_events(filters):
+        async def iter_events():
+            while True:
+                yield await events.get()
+
+        return iter_events()
+
+    async def mock_docker(method, *args, **kwargs):
+        if method == "containers":
+            return [{"Id": "abc123", "Names": ["/jupyter-a"], "State": "running"}]
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    with mock.patch.multiple(
+        DockerSpawner,
+        _shared_docker=lambda self: mock_docker,
+        _shared_docker_events=lambda self: mock_events,
+    ):
+        first = DockerSpawner(watch_events=True)
+        watcher = first.event_watcher
+    # the shared watcher doesn't keep the spawner that created it alive
+    ref = weakref.ref(first)
+    del first
+    gc.collect()
+    assert ref() is None
+
+    spawner = DockerSpawner(watch_events=True, object_name="jupyter-a")
+    spawner.docker = mock_docker
+    assert spawner.event_watcher is watcher
+    try:
+        while not watcher.ready:
+            await asyncio.sleep(0.01)
+        assert await spawner.poll() is None
+        assert spawner.object_id == "abc123"
+        # waiting for the exit is woken by the event
+        wait = asyncio.ensure_future(spawner._wait_for_exit(10))
+        await asyncio.sleep(0.01)
+        assert not wait.done()
+        await events.put(
+            {
+                "Type": "container",
+                "Action": "die",
+                "Actor": {
+                    "ID": "abc123",
+                    "Attributes": {"name": "jupyter-a", "exitCode": "137"},
+                },
+                "time": 0,
+            }
+        )
+        assert await asyncio.wait_for(wait, 1)
+        status = await spawner.poll()
+        assert status == "ExitCode=137, Error='', FinishedAt=1970-01-01T00:00:00Z"
+        await events.put(
+            {
+                "Type": "container",
+                "Action": "destroy",
+                "Actor": {"ID": "abc123", "Attributes": {"name": "jupyter-a"}},
+            }
+        )
+        await asyncio.sleep(0.01)
+        # destroyed containers are dropped from the table
+        assert watcher.containers == {}
+        assert watcher.names == {}
+        assert await spawner.poll() == 0
+        assert spawner.object_id == ""
+        assert await spawner.get_object() is None
+        # unknown containers don't exist
+        spawner.object_name = "jupyter-b"
+        assert await spawner.get_object() is None
+    finally:
+        watcher.stop()
+        spawner._event_watchers.clear()
+
+
+def test_events_knows_all():
+    def watcher(list_filters):
+        watcher = DockerEventWatcher(
+            events=None,
+            list_containers=None,
+            filters={"type": ["container"]},
+            name_pattern=list_filters.get("name"),
+            log=logging.getLogger(),
+            list_filters=list_filters,
+        )
+        watcher.ready = True
+        return watcher
+
+    assert watcher({"name": "jupyter-"}).knows_all("jupyter-a")
+    assert not watcher({"name": "jupyter-"}).knows_all("other")
+    # containers left out by their status may exist
+    assert not watcher({"status": ["running"]}).knows_all("jupyter-a")
+
+
+@mock.patch.object(DockerSpawner, "client", mock.Mock())
+async def test_coalesce_docker_calls():
+    calls = []
+
+    def mock_docker(method, *args, **kwargs):
+        calls.append((method, args))
+        time.sleep(0.1)
+        return {"Id": args[0]}
+
+    spawner = DockerSpawner(coalesce_docker_calls=True)
+    spawner._docker = mock_docker
+    hits = spawner.coalesce_hits["inspect_image"]
+    results = await asyncio.gather(
+        spawner.docker("inspect_image", "a"),
+        spawner.docker("inspect_image", "a"),
+        spawner.docker("inspect_image", "b"),
+    )
+    assert results == [{"Id": "a"}, {"Id": "a"}, {"Id": "b"}]
+    # each caller gets its own copy
+    assert results[0] is not results[1]
+    assert sorted(calls) == [("inspect_image", ("a",)), ("inspect_image", ("b",))]
+    assert spawner.coalesce_hits["inspect_image"] == hits + 1
+    # not coalesced once finished
+    await spawner.docker("inspect_image", "a")
+    assert len(calls) == 3
+
+    # not coalesced with calls to another docker client
+    other = DockerSpawner(coalesce_docker_calls=True)
+    other._docker = mock_docker
+    with mock.patch.object(DockerSpawner, "client", mock.Mock()):
+        other_call = other.docker("inspect_image", "a")
+    await asyncio.gather(spawner.docker("inspect_image", "a"), other_call)
+    assert len(calls) == 5
+
+
+async def test_pull_stream_in_lane():
+    release = threading.Event()
+
+    def stream():
+        yield {"status": "Pulling from library/busybox"}
+        release.wait(5)
+        yield {"status": "Downloaded newer image for busybox:1"}
+
+    def mock_docker(method, *args, **kwargs):
+        assert method == "pull"
+        return stream()
+
+    spawner = DockerSpawner()
+    spawner._docker = mock_docker
+    lane = spawner.lanes["pull"]
+    active = lane.slots.active
+    pull = asyncio.ensure_future(
+        spawner._pull_now("busybox", "1", PullProgress("busybox:1"))
+    )
+    while lane.slots.active == active:
+        await asyncio.sleep(0.01)
+    # the stream holds a pull lane slot until it ends
+    await asyncio.sleep(0.1)
+    assert lane.slots.active == active + 1
+    release.set()
+    await pull
+    assert lane.slots.active == active
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test.sock")
+async def test_pull_dedup():
+    pulls = []
+    active = []
+    max_active = 0
+
+    async def mock_docker(method, *args, **kwargs):
+        nonlocal max_active
+        assert method == "pull"
+        pulls.append(args)
+        active.append(args)
+        max_active = max(max_active, len(active))
+        await asyncio.sleep(0.1)
+        active.remove(args)
+        return []
+
+    spawners = []
+    for i in range(4):
+        spawner = DockerSpawner(pull_policy="always", pull_concurrency=1)
+        spawner.docker = mock_docker
+        spawners.append(spawner)
+    await asyncio.gather(
+        spawners[0].pull_image("busybox:1"),
+        spawners[1].pull_image("busybox:1"),
+        spawners[2].pull_image("busybox:2"),
+        spawners[3].pull_image("busybox:1"),
+    )
+    assert sorted(pulls) == [("busybox", "1"), ("busybox", "2")]
+    assert max_active == 1
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-helper-pull.sock")
+async def test_helper_pull_progress():
+    async def mock_docker(method, *args, **kwargs):
+        assert method == "pull"
+        return []
+
+    spawner = DockerSpawner(pull_policy="always")
+    spawner.docker = mock_docker
+    await spawner.pull_image("user-image:latest")
+    assert spawner._spawn_pull.image == "user-image:latest"
+    # e.g. staging certs doesn't replace the pull reported by progress
+    await spawner.pull_image(spawner.move_certs_image, report_progress=False)
+    assert spawner._spawn_pull.image == "user-image:latest"
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-prepull-slot.sock")
+async def test_pull_slot_for_spawns():
+    active = []
+    done = asyncio.Event()
+
+    async def mock_docker(method, *args, **kwargs):
+        assert method == "pull"
+        active.append(args[0])
+        await done.wait()
+        return []
+
+    spawner = DockerSpawner(pull_policy="always", pull_concurrency=2)
+    spawner.docker = mock_docker
+    prepulls = [
+        asyncio.ensure_future(spawner.prepull_image(f"prepull-{i}:latest"))
+        for i in range(2)
+    ]
+    await asyncio.sleep(0.01)
+    # one slot is kept for spawns
+    assert active == ["prepull-0"]
+    spawn = asyncio.ensure_future(spawner.pull_image("spawn:latest"))
+    await asyncio.sleep(0.01)
+    assert active == ["prepull-0", "spawn"]
+    done.set()
+    await asyncio.gather(spawn, *prepulls)
+    assert active == ["prepull-0", "spawn", "prepull-1"]
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-image-cache.sock")
+async def test_image_cache():
+    calls = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "inspect_image":
+            return {"Id": "sha256:abc", "Config": {"Cmd": ["jupyterhub-singleuser"]}}
+        elif method == "pull":
+            return []
+
+    spawner = DockerSpawner(image_cache_ttl=60)
+    image = spawner.image
+    spawner.get_args = lambda: []
+    spawner.docker = mock_docker
+    await spawner.pull_image(image)
+    assert await spawner.get_command() == ["jupyterhub-singleuser"]
+    assert calls == ["inspect_image"]
+
+    spawner.pull_policy = "always"
+    await spawner.pull_image(image)
+    assert await spawner.get_command() == ["jupyterhub-singleuser"]
+    assert calls == ["inspect_image", "pull", "inspect_image"]
+
+    # image removed
+    spawner._handle_image_event(spawner.image_cache, "delete", "sha256:abc", {})
+    assert spawner.image_cache.get(image) is None
+
+
+def test_prepull_images():
+    spawner = DockerSpawner(
+        allowed_images={"a": "image-a", "b": "image-b", "c": "image-c"},
+    )
+    prepuller = ImagePrePuller(
+        spawner_class=DockerSpawner,
+        config=spawner.config,
+        log=spawner.log,
+        interval=60,
+        mode="all",
+        popular_count=1,
+    )
+    popularity = {"image-c": 2, "image-b": 1}
+    with mock.patch.object(DockerSpawner, "image_popularity", Counter(popularity)):
+        assert prepuller.get_images(spawner) == [
+            "image-c",
+            "image-b",
+            "image-a",
+            spawner.image,
+        ]
+        prepuller.mode = "popular"
+        assert prepuller.get_images(spawner) == ["image-c", spawner.image]
+
+
+async def test_prepuller_per_config():
+    c = Config()
+    c.DockerSpawner.prepull_interval = 60
+    spawner = DockerSpawner(config=c)
+    prepuller = spawner.prepuller
+    # creating a spawner doesn't start pre-pulling
+    assert prepuller.task is None
+    assert DockerSpawner(config=c).prepuller is prepuller
+    c2 = Config()
+    c2.DockerSpawner.prepull_interval = 60
+    c2.DockerSpawner.allowed_images = ["other:latest"]
+    assert DockerSpawner(config=c2).prepuller is not prepuller
+
+
+def test_pull_progress():
+    progress = PullProgress("busybox:1")
+    assert progress.message == "Waiting to pull image busybox:1"
+    progress.start()
+    for msg in [
+        {"status": "Pulling from library/busybox", "id": "1"},
+        {"status": "Pulling fs layer", "id": "a"},
+        {"status": "Already exists", "id": "b"},
+        {
+            "status": "Downloading",
+            "id": "a",
+            "progressDetail": {"current": 500, "total": 1000},
+        },
+    ]:
+        progress.update(msg)
+    assert sorted(progress.layers) == ["a", "b"]
+    assert progress.bytes_downloaded == 500
+    assert progress.bytes_total == 1000
+    # half of a's download, and b
+    assert progress.percent == 72
+    progress.update({"status": "Pull complete", "id": "a"})
+    assert progress.percent == 100
+    progress.finish()
+    assert progress.stats()["bytes"] == 1000
+    assert progress.message.startswith("Pulled image busybox:1 (1.0 kB in")
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-progress.sock")
+async def test_pull_progress_events():
+    messages = [
+        {"status": "Pulling fs layer", "id": "a"},
+        {
+            "status": "Downloading",
+            "id": "a",
+            "progressDetail": {"current": 500, "total": 1000},
+        },
+    ]
+
+    async def mock_docker(method, *args, **kwargs):
+        assert kwargs == {"stream": True, "decode": True}
+        return messages
+
+    spawner = DockerSpawner(pull_policy="always")
+    spawner.docker = mock_docker
+    await spawner.pull_image("busybox:progress")
+    assert spawner._spawn_pull.status == "done"
+    assert DockerSpawner.pull_stats["busybox:progress"]["bytes"] == 500
+
+    messages.append({"error": "no space left on device"})
+    with pytest.raises(docker.errors.APIError):
+        await spawner.pull_image("busybox:progress")
+    assert spawner._spawn_pull.status == "failed"
+
+
+def test_pool_template():
+    create_kwargs = {
+        "image": "busybox",
+        "name": "jupyter-alice",
+        "environment": {"JUPYTERHUB_USER": "alice"},
+        "command": ["jupyterhub-singleuser"],
+        "host_config": {"NetworkMode": "bridge"},
+    }
+    key, template = pool_template(create_kwargs)
+    bob_key, _ = pool_template(
+        dict(create_kwargs, name="jupyter-bob", environment={"JUPYTERHUB_USER": "bob"})
+    )
+    assert key == bob_key
+    assert "name" not in template
+    assert template["environment"] == {}
+    assert template["command"][-1] == "jupyterhub-singleuser"
+    assert template["labels"] == {pool_label: key}
+    other_key, _ = pool_template(dict(create_kwargs, image="other"))
+    assert other_key != key
+
+    exec_kwargs = env_exec_kwargs("abc", {"A": "it's", "N": 1})
+    assert exec_kwargs["container"] == "abc"
+    # the environment is only passed to the exec, not in its command
+    assert exec_kwargs["environment"] == {"A": "it's", "N": "1"}
+    assert "it's" not in " ".join(exec_kwargs["cmd"])
+    assert "umask 077" in exec_kwargs["cmd"][-1]
+    assert not can_inject_env({"not-a-name": "x"})
+
+
+async def test_warm_pool():
+    calls = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "containers":
+            return []
+        elif method == "create_container":
+            return {"Id": kwargs["name"]}
+
+    pool = WarmPool(
+        docker=mock_docker,
+        log=logging.getLogger(),
+        name_prefix="jupyter-pool",
+        size=2,
+        max_containers=3,
+        idle_timeout=60,
+    )
+    try:
+        # first claim fills the pool
+        assert pool.claim("a", {"image": "busybox"}) is None
+        await pool.pools["a"]["task"]
+        assert len(pool.pools["a"]["containers"]) == 2
+        assert calls == ["containers"] + ["create_container", "start"] * 2
+
+        container_id = pool.claim("a", {"image": "busybox"})
+        assert container_id.startswith("jupyter-pool-a-")
+        await pool.pools["a"]["task"]
+        assert len(pool.pools["a"]["containers"]) == 2
+
+        # limited by max_containers
+        assert pool.claim("b", {"image": "other"}) is None
+        await pool.pools["b"]["task"]
+        assert len(pool.pools["b"]["containers"]) == 1
+        assert pool.total == 3
+    finally:
+        pool.stop()
+
+
+async def test_shared_docker():
+    client = mock.Mock()
+    client.inspect_image.return_value = {"Id": "sha256:abc"}
+    spawner = DockerSpawner()
+    spawner.docker_calls = Counter()
+    spawner._start_memo = {}
+    with mock.patch.object(DockerSpawner, "client", client):
+        docker = spawner._shared_docker()
+    assert await docker("inspect_image", "busybox") == {"Id": "sha256:abc"}
+    client.inspect_image.assert_called_once_with("busybox")
+    # not counted as the spawner's calls
+    assert spawner.docker_calls == Counter()
+    # and doesn't keep the spawner alive
+    ref = weakref.ref(spawner)
+    del spawner
+    gc.collect()
+    assert ref() is None
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-pause.sock")
+async def test_pause_mode():
+    calls = []
+    state = {"Running": True, "Paused": False}
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "pause":
+            state["Paused"] = True
+        elif method == "unpause":
+            state["Paused"] = False
+        elif method == "kill":
+            state.update(Running=False, ExitCode=0, Error="", FinishedAt="now")
+        elif method == "inspect_container":
+            return {"Id": "abc", "State": dict(state)}
+        elif method == "containers":
+            assert kwargs["filters"]["status"] == "paused"
+            return []
+
+    spawner = DockerSpawner(
+        stop_mode="pause", pause_timeout=0.2, object_name="jupyter-pause"
+    )
+    spawner.docker = mock_docker
+    spawner.object_id = "abc"
+    spawner.api_token = "token"
+    assert spawner.will_resume
+    await spawner.stop()
+    assert calls == ["pause"]
+    assert spawner.paused_at
+    assert spawner.get_state()["paused_at"] == spawner.paused_at
+    assert await spawner.poll() == "Paused"
+    # the token is kept while paused, even when JupyterHub clears it
+    spawner.clear_state()
+    assert spawner._paused_api_token == "token"
+
+    # the timeout is re-armed when the Hub restarts
+    reloaded = DockerSpawner(stop_mode="pause", pause_timeout=0.2)
+    reloaded.docker = mock_docker
+    reloaded.load_state(spawner.get_state())
+    assert reloaded._pause_timer is not None
+    reloaded._cancel_pause_timeout()
+    # with a sweep for other paused containers
+    sweeps = DockerSpawner._paused_sweeps
+    await asyncio.gather(*sweeps.values())
+    assert "containers" in calls
+    sweeps.clear()
+    calls.clear()
+
+    # stopped for real after pause_timeout
+    await asyncio.wait_for(spawner._pause_timer, timeout=5)
+    # the stop signal is known from the inspect before unpausing
+    assert calls[calls.index("unpause") :] == [
+        "unpause",
+        "kill",
+        "inspect_container",
+    ]
+    assert spawner.paused_at is None
+    assert await spawner.poll() is not None
+
+
+async def test_stop_escalation():
+    calls = []
+    state = {"Running": True}
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append((method, kwargs.get("signal")))
+        if method == "kill" and kwargs["signal"] == "SIGKILL":
+            state["Running"] = False
+        elif method == "inspect_container":
+            return {
+                "Id": "abc",
+                "State": dict(state),
+                "Config": {"StopSignal": "SIGINT"},
+            }
+
+    spawner = DockerSpawner(stop_grace_period=0.5, object_name="jupyter-stop")
+    spawner.docker = mock_docker
+    spawner.object_id = "abc"
+    await spawner.stop_object()
+    kills = [signal for method, signal in calls if method == "kill"]
+    assert kills == ["SIGINT", "SIGKILL"]
+    # inspected with backoff while waiting
+    assert 3 <= len(calls) - len(kills) <= 8
+
+
+async def test_stop_removed():
+    calls = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        raise docker.errors.NotFound("gone", response=mock.Mock(status_code=404))
+
+    spawner = DockerSpawner(remove=True, object_name="jupyter-gone")
+    spawner.docker = mock_docker
+    spawner.object_id = "abc"
+    await spawner._stop()
+    # nothing left to remove
+    assert calls == ["inspect_container"]
+    assert spawner.object_id == ""
+
+
+@mock.patch.object(DockerSpawner, "docker_base_url", "unix:///test-stop-all.sock")
+async def test_stop_batch():
+    active = []
+    max_active = 0
+
+    async def mock_stop(spawner, now=False):
+        nonlocal max_active
+        active.append(spawner)
+        max_active = max(max_active, len(active))
+        await asyncio.sleep(0.1)
+        active.remove(spawner)
+        if spawner.object_name == "jupyter-2":
+            raise RuntimeError("failed to stop")
+
+    spawners = [
+        DockerSpawner(object_name=f"jupyter-{i}", stop_concurrency=2) for i in range(5)
+    ]
+    with mock.patch.object(DockerSpawner, "_stop", mock_stop):
+        results = await asyncio.gather(
+            *(spawner.stop() for spawner in spawners), return_exceptions=True
+        )
+    assert max_active == 2
+    assert [isinstance(result, RuntimeError) for result in results] == [
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+
+
+async def test_stop_batcher():
+    batches = []
+    stopping = asyncio.Event()
+
+    async def stop_all(spawners, now=False):
+        batches.append(spawners)
+        stopping.set()
+        await asyncio.sleep(0.2)
+        return {}
+
+    batcher = StopBatcher(stop_all, window=10)
+    # a lone stop isn't delayed by the window
+    await asyncio.wait_for(batcher.submit("a"), 1)
+    assert batches == [["a"]]
+
+    # a cancelled batch doesn't leave its stops waiting
+    stopping.clear()
+    f = batcher.submit("b")
+    await stopping.wait()
+    for task in asyncio.all_tasks():
+        if task.get_coro().__qualname__ == "StopBatcher._run":
+            task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(f, 1)
+
+
+async def test_start_phases():
+    order = []
+
+    def phase(name, delay):
+        async def run():
+            order.append(f"{name} start")
+            await asyncio.sleep(delay)
+            order.append(f"{name} end")
+            return name
+
+        return run
+
+    durations = {}
+    graph = PhaseGraph(on_phase_done=durations.__setitem__)
+    graph.add("image", phase("image", 0))
+    graph.add("pull", phase("pull", 0.2), after=["image"], weight=3)
+    graph.add("object", phase("object", 0.1), after=["image"])
+    graph.add("create", phase("create", 0), after=["pull", "object"])
+    results = await graph.run()
+    assert results == {name: name for name in ["image", "pull", "object", "create"]}
+    # pull and object run concurrently
+    assert order[2:6] == ["pull start", "object start", "object end", "pull end"]
+    assert order[-1] == "create end"
+    assert sorted(durations) == sorted(results)
+    assert graph.progress == 1
+    assert graph.duration < 0.3
+
+    with pytest.raises(ValueError):
+        graph.add("start", phase("start", 0), after=["nope"])
+
+    # failing phases cancel the rest
+    graph = PhaseGraph()
+    graph.add("slow", phase("slow", 10))
+    graph.add("fail", mock.AsyncMock(side_effect=RuntimeError("failed")))
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(graph.run(), timeout=5)
+
+
+async def test_start_progress_events():
+    spawner = DockerSpawner()
+    spawner._start_events = []
+    spawner._start_events_changed = asyncio.Event()
+    graph = spawner._start_phases = PhaseGraph(on_phase_done=spawner._phase_done)
+    graph.add("image", mock.AsyncMock())
+    graph.add("pull", mock.AsyncMock(), after=["image"], weight=3)
+    spawner._spawn_pending = True
+    run = asyncio.ensure_future(graph.run())
+    events = []
+    async for event in spawner.progress():
+        events.append(event)
+        if len(events) == 2:
+            spawner._spawn_pending = False
+    await run
+    assert [event["progress"] for event in events] == [22, 90]
+    assert events[0]["message"].startswith("Checked image (")
+    assert events[1]["message"].startswith("Pulled image (")
+
+
+async def test_start_round_trips():
+    container = {
+        "Id": "abc123",
+        "State": {"Running": True},
+        "NetworkSettings": {
+            "Ports": {"8888/tcp": [{"HostIp": "127.0.0.1", "HostPort": "32768"}]}
+        },
+    }
+
+    def mock_docker(method, *args, **kwargs):
+        if method == "inspect_container":
+            return container
+        elif method == "exec_create":
+            assert kwargs["container"] == "abc123"
+            return "exec1"
+        elif method == "exec_start":
+            return (b"", None)
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    spawner = DockerSpawner(post_start_cmd="true", object_name="jupyter-rt")
+    spawner.object_id = "abc123"
+    spawner._docker = mock_docker
+    spawner._start_memo = {}
+    spawner.docker_calls = Counter()
+    await spawner.post_start_exec()
+    assert await spawner.get_ip_and_port() == ("127.0.0.1", 32768)
+    assert await spawner.get_ip_and_port() == ("127.0.0.1", 32768)
+    assert spawner.docker_calls == {
+        "exec_create": 1,
+        "exec_start": 1,
+        "inspect_container": 1,
+    }
+
+
+async def test_certs_in_container(tmp_path):
+    archives = []
+
+    async def mock_docker(method, *args, **kwargs):
+        if method == "put_archive":
+            assert kwargs["container"] == "abc"
+            assert kwargs["path"] == "/"
+            with tarfile.open(fileobj=kwargs["data"]) as tf:
+                archives.append(sorted(tf.getnames()))
+            return True
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    paths = {}
+    for key in ("keyfile", "certfile", "cafile"):
+        path = tmp_path / f"{key}.pem"
+        path.write_text(key)
+        paths[key] = str(path)
+
+    user = mock.Mock()
+    user.name = "ssl"
+    spawner = DockerSpawner(user=user, internal_ssl=True)
+    spawner.docker = mock_docker
+    spawner.object_id = "abc"
+    # no certs volume, and no helper container
+    assert spawner.volume_binds == {}
+    nb_paths = await spawner.move_certs(paths)
+    assert nb_paths["cafile"] == "/certs/cafile.pem"
+    assert spawner._certs_staging is None
+
+    # new container
+    spawner._start_memo = {"object": None, "paused": False}
+    await spawner._put_certs_in_container()
+    assert archives == [
+        ["certs", "certs/cafile.pem", "certs/certfile.pem", "certs/keyfile.pem"]
+    ]
+    state = spawner.get_state()
+    assert state["certs_hash"]
+
+    # existing container with the same certs
+    spawner = DockerSpawner(user=user, internal_ssl=True)
+    spawner.docker = mock_docker
+    spawner.load_state(state)
+    await spawner.move_certs(paths)
+    spawner._start_memo = {"object": {"Id": "abc"}, "paused": False}
+    await spawner._put_certs_in_container()
+    assert len(archives) == 1
+
+    # changed certs
+    (tmp_path / "keyfile.pem").write_text("new key")
+    await spawner.move_certs(paths)
+    await spawner._put_certs_in_container()
+    assert len(archives) == 2
+    assert spawner.certs_hash != state["certs_hash"]
+
+    # existing container created with the certs volume mounted read-only
+    staged = mock.AsyncMock()
+    spawner._stage_certs = staged
+    await spawner.move_certs(paths)
+    spawner._start_memo = {
+        "object": {
+            "Id": "abc",
+            "Mounts": [{"Destination": "/certs", "Name": "jupyterhub-ssl-ssl"}],
+        },
+        "paused": False,
+    }
+    await spawner._put_certs_in_container()
+    assert len(archives) == 2
+    assert staged.call_args.kwargs["volume_name"] == "jupyterhub-ssl-ssl"
+
+    # switching to volume staging stages the same certs again
+    spawner.certs_staging = "volume"
+    await spawner.move_certs(paths)
+    assert spawner._certs_staging is not None
+
+
+async def test_docker_metrics():
+    def mock_docker(method, *args, **kwargs):
+        time.sleep(0.05)
+        if args[0] == "missing":
+            raise docker.errors.NotFound("missing", mock.Mock(status_code=404))
+        return {"Id": args[0]}
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(f"dockerspawner_{name}", labels) or 0
+
+    errors_before = sample(
+        "docker_api_call_errors_total", method="inspect_volume", status="404"
+    )
+    calls_before = sample(
+        "docker_api_call_duration_seconds_count", method="inspect_volume"
+    )
+    spawner = DockerSpawner()
+    spawner._docker = mock_docker
+    f = spawner.docker("inspect_volume", "found")
+    await asyncio.sleep(0.02)
+    assert sample("docker_api_calls_running", lane="read") == 1
+    assert await f == {"Id": "found"}
+    with pytest.raises(docker.errors.NotFound):
+        await spawner.docker("inspect_volume", "missing")
+    assert sample("docker_api_calls_running", lane="read") == 0
+    assert sample("docker_api_calls_queued", lane="read") == 0
+    assert (
+        sample("docker_api_call_errors_total", method="inspect_volume", status="404")
+        == errors_before + 1
+    )
+    assert (
+        sample("docker_api_call_duration_seconds_count", method="inspect_volume")
+        == calls_before + 2
+    )
+
+    # phases
+    before = sample("spawn_phase_duration_seconds_count", phase="create")
+    spawner._start_events = []
+    spawner._start_events_changed = asyncio.Event()
+    spawner._start_phases = PhaseGraph()
+    spawner._phase_done("create", 0.1)
+    assert sample("spawn_phase_duration_seconds_count", phase="create") == before + 1
@@ -1,13 +1,21 @@
 """Tests for SwarmSpawner"""
 
 import asyncio
+import logging
+from unittest import mock
 
+import pytest
+from docker.errors import APIError
 from jupyterhub.tests.mocking import public_url
 from jupyterhub.tests.test_api import add_user, api_request
 from jupyterhub.utils import url_path_join
 from tornado.httpclient import AsyncHTTPClient
+from traitlets.config import Config
 
 from dockerspawner import SwarmSpawner
+from dockerspawner.events import DockerEventWatcher
+from dockerspawner.phases import PhaseGraph
+from dockerspawner.swarmspawner import certs_label, prepull_label
 
 
 async def test_start_stop(swarmspawner_configured_app):
@@ -37,3 +45,603 @@ async def test_start_stop(swarmspawner_configured_app):
     assert resp.effective_url == url
     resp.rethrow()
     assert "kernels" in resp.body.decode("utf-8")
+
+
+async def test_wait_for_task_change():
+    watcher = DockerEventWatcher(
+        events=None,
+        list_containers=None,
+        filters={},
+        name_pattern="jupyter",
+        log=logging.getLogger(),
+    )
+    # nothing happens
+    assert not await watcher.wait_for_change(0.05, service_name="jupyter-a")
+
+    async def later(event):
+        await asyncio.sleep(0.05)
+        watcher.handle_event(event)
+
+    # another service's container starting doesn't count
+    other = {
+        "Type": "container",
+        "Action": "start",
+        "Actor": {
+            "ID": "abc",
+            "Attributes": {
+                "name": "jupyter-b.1.xyz",
+                "com.docker.swarm.service.name": "jupyter-b",
+            },
+        },
+        "time": 0,
+    }
+    asyncio.ensure_future(later(other))
+    assert not await watcher.wait_for_change(0.2, service_name="jupyter-a")
+
+    ours = {
+        "Type": "service",
+        "Action": "update",
+        "Actor": {"ID": "svc", "Attributes": {"name": "jupyter-a"}},
+    }
+    asyncio.ensure_future(later(ours))
+    assert await watcher.wait_for_change(5, service_name="jupyter-a")
+
+
+async def test_task_poll_backoff():
+    spawner = SwarmSpawner(task_poll_interval=1)
+    delay = spawner.task_poll_interval
+    with mock.patch("asyncio.sleep", mock.AsyncMock()) as sleep:
+        for _ in range(8):
+            delay = await spawner._wait_for_task_change(delay)
+        delays = [call.args[0] for call in sleep.call_args_list]
+    # backs off without events
+    assert delays[:3] == [1, 1.5, 2.25]
+    assert delays[-1] == 11
+
+
+def test_removed_services_bounded():
+    watcher = DockerEventWatcher(
+        events=None,
+        list_containers=None,
+        filters={},
+        name_pattern=["jupyter-", "notebook-"],
+        log=logging.getLogger(),
+    )
+    assert watcher._tracked("notebook-a")
+    assert not watcher._tracked("other")
+    watcher.max_removed_services = 2
+    for name in ["jupyter-a", "jupyter-b", "jupyter-c"]:
+        watcher.handle_event(
+            {
+                "Type": "service",
+                "Action": "remove",
+                "Actor": {"ID": name, "Attributes": {"name": name}},
+            }
+        )
+    assert list(watcher.removed_services) == ["jupyter-b", "jupyter-c"]
+
+
+async def test_task_rejected():
+    services = []
+    calls = []
+    rejected_node = "node1"
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "create_service":
+            services.append(kwargs["task_template"].get("Placement", {}))
+            return {"ID": f"svc{len(services)}"}
+        elif method == "tasks":
+            # the first node rejects the task, and is replaced by a pending one
+            if len(services) == 1:
+                return [
+                    {
+                        "CreatedAt": "2",
+                        "NodeID": "node1",
+                        "Status": {"State": "pending"},
+                    },
+                    {
+                        "CreatedAt": "1",
+                        "NodeID": rejected_node,
+                        "Status": {
+                            "State": "rejected",
+                            "Err": "No such image: nosuchimage",
+                        },
+                    },
+                ]
+            return [
+                {"CreatedAt": "3", "NodeID": "node2", "Status": {"State": "running"}}
+            ]
+
+    spawner = SwarmSpawner(object_name="jupyter-rejected", task_poll_interval=0.01)
+    spawner.docker = mock_docker
+    spawner.object_id = "svc1"
+    services.append({})
+    with pytest.raises(RuntimeError, match="No such image: nosuchimage"):
+        await spawner.start_object()
+    assert calls == ["tasks", "remove_service"]
+    assert spawner.object_id == ""
+
+    # with a retry, the service is recreated away from the failed node
+    services.clear()
+    services.append({})
+    spawner.task_retries = 1
+    spawner.object_id = "svc1"
+    spawner._get_start_command = mock.AsyncMock(return_value=[])
+    spawner.get_env = lambda: {}
+    await spawner.start_object()
+    assert spawner.object_id == "svc2"
+    assert services[1]["Constraints"] == ["node.id!=node1"]
+    assert spawner._excluded_nodes == ()
+
+    # a task rejected before it was assigned a node excludes none
+    rejected_node = ""
+    services.clear()
+    services.append({})
+    spawner.object_id = "svc1"
+    await spawner.start_object()
+    assert spawner.object_id == "svc2"
+    assert "Constraints" not in services[1]
+
+
+async def test_batch_poll():
+    calls = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "tasks" and kwargs["filters"] == {"name": "jupyterbatch"}:
+            await asyncio.sleep(0.1)
+            return [
+                {
+                    "ServiceID": "svc-a",
+                    "CreatedAt": "1",
+                    "DesiredState": "shutdown",
+                    "Status": {"State": "failed"},
+                },
+                {
+                    "ServiceID": "svc-a",
+                    "CreatedAt": "2",
+                    "DesiredState": "running",
+                    "Spec": {"ContainerSpec": {"Image": "batch:latest@sha256:abc"}},
+                    "NodeID": "node1",
+                    "Status": {"State": "running"},
+                },
+                {
+                    "ServiceID": "svc-b",
+                    "CreatedAt": "1",
+                    "DesiredState": "shutdown",
+                    "Status": {"State": "complete"},
+                },
+            ]
+        elif method == "tasks":
+            return [{"ServiceID": "svc-b", "Status": {"State": "complete"}}]
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    spawners = []
+    for name, service_id in [("a", "svc-a"), ("a", "svc-a"), ("b", "svc-b")]:
+        spawner = SwarmSpawner(
+            batch_poll=True, prefix="jupyterbatch", object_name=f"jupyterbatch-{name}"
+        )
+        spawner.docker = mock_docker
+        spawner.object_id = service_id
+        spawners.append(spawner)
+
+    results = await asyncio.gather(*(spawner.poll() for spawner in spawners))
+    assert results[:2] == [None, None]
+    assert "complete" in results[2]
+    # one listing for all, the stopped service is looked up for its status
+    assert sorted(calls) == ["tasks", "tasks"]
+
+
+async def test_start_round_trips():
+    calls = []
+    tasks = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "create_service":
+            tasks.append({"DesiredState": "running", "Status": {"State": "running"}})
+            return {"ID": "svc"}
+        elif method == "tasks":
+            return tasks
+        elif method == "inspect_service":
+            return {
+                "ID": "svc",
+                "Endpoint": {"Ports": [{"TargetPort": 8888, "PublishedPort": 30001}]},
+            }
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    spawner = SwarmSpawner(
+        object_name="jupyter-trips", host_ip="10.0.0.1", use_internal_ip=False
+    )
+    spawner.docker = mock_docker
+    spawner.get_env = lambda: {}
+    spawner._start_memo = {}
+    spawner._get_start_command = mock.AsyncMock(return_value=[])
+    obj = await spawner.create_object()
+    spawner.object_id = obj["ID"]
+    await spawner.start_object()
+    assert await spawner.get_ip_and_port() == ("10.0.0.1", 30001)
+    assert await spawner.get_ip_and_port() == ("10.0.0.1", 30001)
+    # the tasks listed after creating are reused, the service is inspected once
+    assert calls == ["create_service", "tasks", "inspect_service"]
+
+    # one listing to poll
+    spawner._start_memo = None
+    calls.clear()
+    assert await spawner.poll() is None
+    assert calls == ["tasks"]
+
+
+async def test_suspend():
+    calls = []
+    service = {
+        "ID": "svc",
+        "Version": {"Index": 5},
+        "Spec": {
+            "TaskTemplate": {
+                "ContainerSpec": {
+                    "Image": "jupyterhub/singleuser:latest@sha256:abc",
+                    "Env": ["JUPYTERHUB_API_TOKEN=secret"],
+                }
+            }
+        },
+        "Endpoint": {"Ports": [{"TargetPort": 8888, "PublishedPort": 30001}]},
+    }
+    tasks = [{"ID": "old", "DesiredState": "shutdown", "Status": {"State": "failed"}}]
+    scheduled = []
+    user = mock.Mock()
+    user.name = "suspend"
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append((method, kwargs.get("mode")))
+        if method == "inspect_service":
+            return service
+        elif method == "update_service":
+            assert kwargs["version"] == 5
+            assert kwargs["fetch_current_spec"]
+            if kwargs["mode"]["replicated"]["Replicas"]:
+                # not scheduled yet at the first listing
+                scheduled.append(
+                    {
+                        "ID": "new",
+                        "DesiredState": "running",
+                        "Status": {"State": "running"},
+                    }
+                )
+            return {}
+        elif method == "tasks":
+            listed = list(tasks)
+            tasks.extend(scheduled)
+            scheduled.clear()
+            return listed
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    spawner = SwarmSpawner(
+        user=user,
+        image="jupyterhub/singleuser:latest",
+        suspend_services=True,
+        use_internal_ip=False,
+        host_ip="10.0.0.1",
+    )
+    spawner.docker = mock_docker
+    spawner.object_id = "svc"
+    assert spawner.will_resume
+    await spawner._stop()
+    assert calls == [
+        ("inspect_service", None),
+        ("update_service", {"replicated": {"Replicas": 0}}),
+    ]
+    state = spawner.get_state()
+    assert state["suspended"]
+    assert state["object_id"] == "svc"
+
+    spawner = SwarmSpawner(
+        user=user,
+        image="jupyterhub/singleuser:latest",
+        suspend_services=True,
+        use_internal_ip=False,
+        host_ip="10.0.0.1",
+        task_poll_interval=0.01,
+    )
+    spawner.docker = mock_docker
+    spawner.load_state(state)
+    spawner._start_memo = {}
+    calls.clear()
+    await spawner._find_object()
+    await spawner._create_start_object()
+    await spawner._start_or_resume_object()
+    assert await spawner.get_ip_and_port() == ("10.0.0.1", 30001)
+    # scaled up, not created, the old failed task is ignored,
+    # and we wait for the new task
+    assert [method for method, mode in calls] == [
+        "inspect_service",
+        "tasks",
+        "update_service",
+        "tasks",
+        "tasks",
+    ]
+    assert calls[2][1] == {"replicated": {"Replicas": 1}}
+    assert spawner.api_token == "secret"
+    assert not spawner.get_state().get("suspended")
+
+
+def test_shared_stop_mode():
+    # DockerSpawner's pause mode doesn't apply to services
+    config = Config()
+    config.DockerSpawner.stop_mode = "pause"
+    spawner = SwarmSpawner(config=config)
+    assert spawner.stop_mode == "pause"
+    assert not spawner.will_resume
+
+
+@mock.patch.object(SwarmSpawner, "docker_base_url", "unix:///test-locality.sock")
+async def test_image_locality():
+    created = []
+    tasks = {}
+
+    async def mock_docker(method, *args, **kwargs):
+        if method == "create_service":
+            placement = kwargs["task_template"].get("Placement", {})
+            constraints = placement.get("Constraints") or []
+            created.append(constraints)
+            service_id = f"svc{len(created)}"
+            if "node.id!=node2" in constraints and len(created) == 2:
+                # node1 is full
+                status = {"State": "pending", "Err": "no suitable node"}
+            else:
+                status = {"State": "running"}
+            tasks[kwargs["name"]] = [
+                {"ID": service_id, "NodeID": "node1", "Status": status}
+            ]
+            return {"ID": service_id}
+        elif method == "tasks":
+            return tasks[kwargs["filters"]["service"]]
+        elif method == "remove_service":
+            return
+        elif method == "nodes":
+            return [{"ID": node_id} for node_id in node_ids]
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    async def start(name):
+        user = mock.Mock()
+        user.name = name
+        spawner = SwarmSpawner(
+            user=user, image="locality:latest", image_locality=True, prefix="loc"
+        )
+        spawner.docker = mock_docker
+        spawner.get_env = lambda: {}
+        spawner._start_memo = {}
+        spawner._get_start_command = mock.AsyncMock(return_value=[])
+        obj = await spawner.create_object()
+        spawner.object_id = obj["ID"]
+        await spawner.start_object()
+        return spawner
+
+    node_ids = ["node1", "node2", "node3"]
+    # no node known to have the image
+    await start("a")
+    assert created == [[]]
+    # kept off the nodes without the image, but can't be scheduled
+    spawner = await start("b")
+    assert created[1:] == [["node.id!=node2", "node.id!=node3"], []]
+    assert spawner.object_id == "svc3"
+    # nodes that left the swarm are forgotten
+    node_ids.remove("node1")
+    await start("c")
+    assert created[3:] == [[]]
+
+
+@mock.patch.object(SwarmSpawner, "docker_base_url", "unix:///test-prepull-job.sock")
+async def test_prepull_job():
+    calls = []
+
+    async def mock_docker(method, *args, **kwargs):
+        calls.append(method)
+        if method == "remove_service":
+            if calls.count("remove_service") == 1:
+                raise APIError("not found", mock.Mock(status_code=404))
+            return
+        elif method == "create_service":
+            assert kwargs["mode"] == {"GlobalJob": {}}
+            assert kwargs["labels"] == {prepull_label: "prepull:latest"}
+            container_spec = kwargs["task_template"]["ContainerSpec"]
+            assert container_spec["Command"] == ["true"]
+            assert container_spec["Args"] == []
+            return {"ID": "job"}
+        elif method == "tasks":
+            if calls.count("tasks") == 1:
+                return []
+            return [
+                {"NodeID": "node1", "Status": {"State": "complete"}},
+                {
+                    "NodeID": "node2",
+                    "Status": {"State": "rejected", "Err": "No such image"},
+                },
+                {
+                    # no `true` in the image
+                    "NodeID": "node3",
+                    "Status": {
+                        "State": "failed",
+                        "Err": "executable file not found",
+                        "ContainerStatus": {"ContainerID": "abc", "ExitCode": 127},
+                    },
+                },
+            ]
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    spawner = SwarmSpawner(task_poll_interval=0.01, image_locality=True)
+    spawner.docker = mock_docker
+    nodes = await spawner.prepull_image("prepull:latest")
+    assert nodes == {
+        "node1": {"state": "complete", "error": None},
+        "node2": {"state": "rejected", "error": "No such image"},
+        # the image was pulled, the command failed
+        "node3": {"state": "complete", "error": None},
+    }
+    assert spawner._image_nodes["prepull:latest"] == {"node1", "node3"}
+    # the job is removed when done
+    assert calls == [
+        "remove_service",
+        "create_service",
+        "tasks",
+        "tasks",
+        "remove_service",
+    ]
+
+
+async def test_cert_secrets(tmp_path):
+    secrets = {}
+    services = []
+
+    async def mock_docker(method, *args, **kwargs):
+        if method == "secrets":
+            return [
+                {"ID": secret_id, "Spec": {"Name": name}}
+                for secret_id, name in secrets.items()
+            ]
+        elif method == "create_secret":
+            name, content = args
+            assert kwargs["labels"] == {certs_label: "jupyter-ssl"}
+            secret_id = f"secret{len(secrets)}"
+            secrets[secret_id] = name
+            return {"ID": secret_id}
+        elif method == "remove_secret":
+            if args[0] == "in-use":
+                raise APIError("in use", mock.Mock(status_code=409))
+            secrets.pop(args[0])
+            return
+        elif method == "create_service":
+            services.append(kwargs["task_template"]["ContainerSpec"])
+            return {"ID": "svc"}
+        elif method == "tasks":
+            return [{"Status": {"State": "running"}}]
+        elif method == "remove_service":
+            return
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    paths = {}
+    for key in ("keyfile", "certfile", "cafile"):
+        path = tmp_path / f"{key}.pem"
+        path.write_text(key)
+        paths[key] = str(path)
+
+    user = mock.Mock()
+    user.name = "ssl"
+    spawner = SwarmSpawner(user=user, internal_ssl=True)
+    spawner.docker = mock_docker
+    spawner.get_env = lambda: {}
+    spawner._get_start_command = mock.AsyncMock(return_value=[])
+    assert spawner.volume_binds == {}
+    nb_paths = await spawner.move_certs(paths)
+    assert nb_paths["keyfile"] == "/certs/keyfile.pem"
+    # the secrets are created in a phase of start, before the service
+    assert not secrets
+    graph = PhaseGraph()
+    spawner._add_start_phases(graph)
+    assert "certs" in graph.phases["create"]["after"]
+    await spawner._run_certs_staging()
+    await spawner.create_object()
+    targets = {
+        secret["File"]["Name"]: secret["SecretName"]
+        for secret in services[0]["Secrets"]
+    }
+    assert sorted(targets) == sorted(nb_paths.values())
+    assert len(secrets) == 3
+
+    # the same certs reuse the secrets
+    await spawner.move_certs(paths)
+    await spawner._run_certs_staging()
+    assert len(secrets) == 3
+
+    # secrets are removed on stop, unless still in use
+    secrets["in-use"] = "other"
+    spawner.object_id = "svc"
+    await spawner._stop()
+    assert secrets == {"in-use": "other"}
+
+
+async def test_cert_secrets_suspend(tmp_path):
+    secrets = {}
+    created = []
+    tasks = []
+    service = {
+        "ID": "svc",
+        "Version": {"Index": 1},
+        "Spec": {
+            "TaskTemplate": {
+                "ContainerSpec": {"Image": "jupyterhub/singleuser:latest@sha256:abc"}
+            }
+        },
+    }
+
+    async def mock_docker(method, *args, **kwargs):
+        if method == "secrets":
+            return [
+                {"ID": secret_id, "Spec": {"Name": name}}
+                for secret_id, name in secrets.items()
+            ]
+        elif method == "create_secret":
+            secret_id = f"secret{len(created)}"
+            created.append(secret_id)
+            secrets[secret_id] = args[0]
+            return {"ID": secret_id}
+        elif method == "remove_secret":
+            secrets.pop(args[0])
+            return
+        elif method == "inspect_service":
+            return service
+        elif method == "update_service":
+            if kwargs["mode"]["replicated"]["Replicas"]:
+                tasks.insert(
+                    0, {"ID": f"task{len(tasks)}", "Status": {"State": "running"}}
+                )
+            return {}
+        elif method == "remove_service":
+            return
+        elif method == "create_service":
+            tasks.insert(0, {"ID": f"task{len(tasks)}", "Status": {"State": "running"}})
+            return {"ID": "svc2"}
+        elif method == "tasks":
+            return list(tasks)
+        raise ValueError(f"Unexpected docker call: {method}")
+
+    paths = {}
+    for key in ("keyfile", "certfile", "cafile"):
+        paths[key] = str(tmp_path / f"{key}.pem")
+
+    user = mock.Mock()
+    user.name = "ssl"
+    state = {}
+
+    async def spawn(image="jupyterhub/singleuser:latest"):
+        # new certs for every spawn
+        for key, path in paths.items():
+            with open(path, "w") as f:
+                f.write(f"{key} {len(created)}")
+        spawner = SwarmSpawner(
+            user=user, image=image, internal_ssl=True, suspend_services=True
+        )
+        spawner.docker = mock_docker
+        spawner.get_env = lambda: {}
+        spawner._get_start_command = mock.AsyncMock(return_value=[])
+        spawner.load_state(state)
+        await spawner.move_certs(paths)
+        spawner._start_memo = {}
+        await spawner._find_object()
+        await spawner._run_certs_staging()
+        await spawner._create_start_object()
+        spawner._start_memo.pop("tasks", None)
+        await spawner._start_or_resume_object()
+        await spawner._stop()
+        state.update(spawner.get_state())
+
+    await spawn()
+    assert len(secrets) == 3
+    # resumed services keep their secrets
+    await spawn()
+    await spawn()
+    assert sorted(secrets) == ["secret0", "secret1", "secret2"]
+    # a replaced service's secrets are removed
+    await spawn(image="jupyterhub/singleuser:new")
+    assert sorted(secrets) == ["secret3", "secret4", "secret5"]